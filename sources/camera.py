@@ -16,21 +16,551 @@
 
 
 import cv2
+import numpy as np
 import os
+import glob
+import platform
+import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+import threading
 import time
 from PIL import Image, ImageFont, ImageDraw
 
 
+class FrameGrabber(object):
+
+    # Maximum time (in seconds) read() waits for a frame, several frame intervals even for slow cameras.
+    # So a device that stops giving frames makes read() fail like an unthreaded capture instead of blocking forever.
+    READ_TIMEOUT = 0.5
+
+    def __init__(self, capture, buffer_size: int = 2) -> None:
+        """Initialize a background frame grabber. Once started, it continuously reads the capture into a small ring buffer
+        so the consumers always get the freshest frame instead of the stale ones queued by OpenCV.
+
+        Args:
+            capture (cv2.VideoCapture): The capture to read the frames from (anything with a read() method).
+            buffer_size (int, optional): Number of frames kept in the ring buffer. Defaults to 2.
+        """
+
+        # Initialize class variables.
+        self.capture = capture
+        self.buffer = deque(maxlen=buffer_size)
+        self.condition = threading.Condition()
+        self.thread = None
+        self.running = False
+
+        # Set by the thread once it no longer reads the capture, and asked to release it if stop() could not wait for that.
+        self.done = False
+        self.release_on_exit = False
+
+        # Sequence number of the last frame grabbed and of the last frame handed out.
+        self.last_sequence = 0
+        self.last_consumed = 0
+
+        # Counters.
+        self.frames_grabbed = 0
+        self.frames_dropped = 0
+        self.read_failures = 0
+
+    def __enter__(self) -> "FrameGrabber":
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def start(self) -> "FrameGrabber":
+        """Start the grabber thread, if it is not already running.
+
+        Returns:
+            FrameGrabber: The started grabber.
+        """
+
+        if self.thread is None:
+            self.running = True
+            self.done = False
+            self.release_on_exit = False
+            self.thread = threading.Thread(
+                target=self._run, name="FrameGrabber", daemon=True)
+            self.thread.start()
+
+        # Return the grabber.
+        return self
+
+    def stop(self, timeout: float = 2.0, release: bool = False) -> None:
+        """Stop the grabber thread and wake up the consumers waiting for a frame. The buffered frames are dropped.
+
+        Args:
+            timeout (float, optional): Maximum time (in seconds) to wait for the thread to end. Defaults to 2.0.
+            release (bool, optional): Also release the capture, once the thread no longer reads it. If the thread is still
+                inside a read when the timeout expires, the thread releases the capture itself when the read returns. Defaults to False.
+        """
+
+        with self.condition:
+            self.running = False
+            self.buffer.clear()
+            self.last_consumed = self.last_sequence
+            self.condition.notify_all()
+
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+        if release:
+            with self.condition:
+                # Release the capture now only if the thread is done with it.
+                if self.thread is None or self.done:
+                    self.capture.release()
+                else:
+                    self.release_on_exit = True
+
+        self.thread = None
+
+    def is_running(self) -> bool:
+        """Check if the grabber thread is running.
+
+        Returns:
+            bool: True if the grabber is running, False otherwise.
+        """
+        return self.thread is not None and self.thread.is_alive()
+
+    def latest(self) -> tuple:
+        """Get the most recent frame without waiting.
+
+        Returns:
+            bool: True if a frame is available, False otherwise.
+            np.ndarray: The frame (None if no frame was grabbed yet or the grabber was stopped).
+        """
+
+        with self.condition:
+            if not self.buffer:
+                return (False, None)
+
+            # Hand out the most recent frame.
+            (sequence, frame) = self.buffer[-1]
+            self.last_consumed = sequence
+            return (True, frame)
+
+    def next(self, timeout: float = None) -> tuple:
+        """Get a frame that was not handed out yet, waiting for the grabber if needed.
+
+        Args:
+            timeout (float, optional): Maximum time (in seconds) to wait. Defaults to None (wait forever).
+
+        Returns:
+            bool: True if a frame was received, False on timeout or once the grabber is stopped.
+            np.ndarray: The frame (None if no frame was received).
+        """
+
+        with self.condition:
+            # Wait for a frame newer than the last one handed out.
+            self.condition.wait_for(
+                lambda: self.last_sequence > self.last_consumed or not self.running, timeout)
+            if self.last_sequence <= self.last_consumed:
+                return (False, None)
+
+            # Hand out the most recent frame.
+            (sequence, frame) = self.buffer[-1]
+            self.last_consumed = sequence
+            return (True, frame)
+
+    def read(self) -> tuple:
+        """Read the freshest frame, with the same interface as cv2.VideoCapture.read().
+        Waits at most READ_TIMEOUT for a new frame.
+
+        Returns:
+            bool: True if a frame was received, False otherwise (no new frame in time, or the grabber is stopped).
+            np.ndarray: The frame (None if no frame was received).
+        """
+        return self.next(FrameGrabber.READ_TIMEOUT)
+
+    def _run(self) -> None:
+        """Read the frames from the capture until the grabber is stopped.
+        """
+
+        while self.running:
+            (ret, frame) = self.capture.read()
+            if not ret:
+                self.read_failures += 1
+                time.sleep(0.01)
+                continue
+
+            with self.condition:
+                # The grabber was stopped during the read.
+                if not self.running:
+                    break
+
+                # The frame pushed out of the buffer (or replacing the last one) was never handed out.
+                if self.last_sequence > self.last_consumed:
+                    self.frames_dropped += 1
+
+                # Store the frame and wake up the consumers.
+                self.last_sequence += 1
+                self.frames_grabbed += 1
+                self.buffer.append((self.last_sequence, frame))
+                self.condition.notify_all()
+
+        # The capture is no longer read, release it if stop() could not wait for the thread.
+        with self.condition:
+            self.done = True
+            release = self.release_on_exit
+        if release:
+            self.capture.release()
+
+
+class CaptureSession(object):
+
+    # Time (in seconds) to wait before reading again after a failed read, so the readers do not spin.
+    READ_RETRY_DELAY = 0.01
+
+    def __init__(self, camera_index: int = -1, warmup_timeout: float = 2.0, warmup_tolerance: float = 1.0, warmup_stable_frames: int = 3, threaded: bool = False) -> None:
+        """Initialize a long-lived capture session. The device is opened once and kept warm.
+
+        Args:
+            camera_index (int, optional): Specify the camera index. Defaults to the first camera available.
+            warmup_timeout (float, optional): Maximum time (in seconds) spent warming up the camera. Defaults to 2.0.
+            warmup_tolerance (float, optional): Maximum brightness change between two frames considered stable. Defaults to 1.0.
+            warmup_stable_frames (int, optional): Number of consecutive stable frames ending the warm-up. Defaults to 3.
+            threaded (bool, optional): Read the frames in a background FrameGrabber so read() always returns the freshest one. Defaults to False.
+        """
+
+        # Get the first camera available if none is specified.
+        if camera_index == -1:
+            camera_index = CameraUtils.list_cameras()[0]
+
+        # Initialize class variables.
+        self.camera_index = camera_index
+        self.warmup_timeout = warmup_timeout
+        self.warmup_tolerance = warmup_tolerance
+        self.warmup_stable_frames = warmup_stable_frames
+        self.threaded = threaded
+        self.capture = None
+        self.grabber = None
+        self.lock = threading.Lock()
+
+    def __enter__(self) -> "CaptureSession":
+        return self.open()
+
+    def __exit__(self, *args) -> None:
+        self.release()
+
+    def __iter__(self):
+        # Stream the frames of the camera, skipping the failed reads. (A camera never ends)
+        while True:
+            (ret, frame) = self.read()
+            if not ret:
+                time.sleep(CaptureSession.READ_RETRY_DELAY)
+                continue
+            yield frame
+
+    def open(self) -> "CaptureSession":
+        """Open the camera and warm it up, if it is not already opened.
+
+        Returns:
+            CaptureSession: The opened session.
+        """
+
+        with self.lock:
+            if self.capture is None:
+                # Open the camera using OpenCv python module.
+                self.capture = cv2.VideoCapture(self.camera_index)
+
+                # Keep as few frames as possible in the OpenCV buffer (ignored by some backends).
+                self.capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+                # Wait for the camera to deliver stable frames.
+                self._warm_up()
+
+                # Start grabbing the frames in the background.
+                if self.threaded:
+                    self.grabber = FrameGrabber(self.capture).start()
+
+        # Return the session.
+        return self
+
+    def is_opened(self) -> bool:
+        """Check if the camera is opened.
+
+        Returns:
+            bool: True if the camera is opened, False otherwise.
+        """
+        return self.capture is not None and self.capture.isOpened()
+
+    def read(self) -> tuple:
+        """Read a frame from the camera, opening it if needed.
+
+        Returns:
+            bool: True if the frame was read, False otherwise.
+            np.ndarray: The frame.
+        """
+
+        # Open the camera the first time a frame is needed.
+        if self.capture is None:
+            self.open()
+
+        # Get the freshest frame from the grabber.
+        if self.grabber is not None:
+            return self.grabber.read()
+
+        # Read the frame.
+        with self.lock:
+            return self.capture.read()
+
+    def release(self) -> None:
+        """Release the camera.
+        """
+
+        with self.lock:
+            # Stop the grabber, it releases the camera once it no longer reads from it.
+            if self.grabber is not None:
+                self.grabber.stop(release=True)
+                self.grabber = None
+            elif self.capture is not None:
+                self.capture.release()
+            self.capture = None
+
+    def _warm_up(self) -> None:
+        """Read frames until their brightness stops changing (auto-exposure settled) or the timeout is reached.
+        """
+
+        previous_brightness = None
+        stable_frames = 0
+        deadline = time.monotonic() + self.warmup_timeout
+
+        while stable_frames < self.warmup_stable_frames and time.monotonic() < deadline:
+            (ret, frame) = self.capture.read()
+            if not ret:
+                continue
+
+            # Compare the average brightness of this frame with the previous one.
+            brightness = sum(cv2.mean(frame)[:3]) / 3
+            if previous_brightness is not None and abs(brightness - previous_brightness) <= self.warmup_tolerance:
+                stable_frames += 1
+            else:
+                stable_frames = 0
+            previous_brightness = brightness
+
+
+class FrameSource(object):
+    """Base class of the frame sources other than the cameras: a video file, a directory of images or a synthetic generator.
+    They can be used like a CaptureSession (open, read, release), for example as the session of a Camera, and be iterated over.
+    """
+
+    # The sources are not cameras.
+    camera_index = None
+
+    def __enter__(self) -> "FrameSource":
+        return self.open()
+
+    def __exit__(self, *args) -> None:
+        self.release()
+
+    def __iter__(self):
+        # Stream the frames until the source is exhausted.
+        while True:
+            (ret, frame) = self.read()
+            if not ret:
+                return
+            yield frame
+
+    def open(self) -> "FrameSource":
+        """Open the source.
+
+        Returns:
+            FrameSource: The opened source.
+        """
+        return self
+
+    def is_opened(self) -> bool:
+        """Check if the source is opened.
+
+        Returns:
+            bool: True if the source is opened, False otherwise.
+        """
+        return True
+
+    def read(self) -> tuple:
+        """Read the next frame.
+
+        Returns:
+            bool: True if the frame was read, False if the source is exhausted.
+            np.ndarray: The frame, None if the source is exhausted.
+        """
+        raise NotImplementedError
+
+    def release(self) -> None:
+        """Release the source.
+        """
+        pass
+
+
+class VideoFileSource(FrameSource):
+    def __init__(self, path: str, loop: bool = False) -> None:
+        """Initialize a source reading the frames of a video file, as fast as they can be decoded.
+
+        Args:
+            path (str): The path of the video file.
+            loop (bool, optional): Restart from the first frame at the end of the video. Defaults to False.
+        """
+
+        # Initialize class variables.
+        self.path = path
+        self.loop = loop
+        self.capture = None
+        self.lock = threading.Lock()
+
+    def open(self) -> "VideoFileSource":
+        with self.lock:
+            if self.capture is None:
+                self.capture = cv2.VideoCapture(self.path)
+        return self
+
+    def is_opened(self) -> bool:
+        return self.capture is not None and self.capture.isOpened()
+
+    def read(self) -> tuple:
+        # Open the video the first time a frame is needed.
+        if self.capture is None:
+            self.open()
+
+        with self.lock:
+            (ret, frame) = self.capture.read()
+
+            # Rewind at the end of the video.
+            if not ret and self.loop:
+                self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                (ret, frame) = self.capture.read()
+
+        return (ret, frame)
+
+    def release(self) -> None:
+        with self.lock:
+            if self.capture is not None:
+                self.capture.release()
+                self.capture = None
+
+    def get_fps(self) -> float:
+        """Get the frame rate of the video.
+
+        Returns:
+            float: The number of frames per second, 0 if unknown.
+        """
+        self.open()
+        return self.capture.get(cv2.CAP_PROP_FPS)
+
+    def get_frame_count(self) -> int:
+        """Get the number of frames of the video (estimated by some backends).
+
+        Returns:
+            int: The number of frames.
+        """
+        self.open()
+        return int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT))
+
+
+class ImageDirectorySource(FrameSource):
+    def __init__(self, path: str, loop: bool = False) -> None:
+        """Initialize a source reading the images of a directory, in the order of their names.
+
+        Args:
+            path (str): The path of the directory.
+            loop (bool, optional): Restart from the first image after the last one. Defaults to False.
+        """
+
+        # Initialize class variables.
+        self.path = path
+        self.loop = loop
+        self.files = CameraUtils.list_images(path)
+        self.position = 0
+        self.lock = threading.Lock()
+
+    def read(self) -> tuple:
+        with self.lock:
+            while True:
+                # Rewind after the last image.
+                if self.position >= len(self.files):
+                    if not self.loop or not self.files:
+                        return (False, None)
+                    self.position = 0
+
+                # Read the next image, skipping the files that cannot be read.
+                frame = cv2.imread(self.files[self.position])
+                self.position += 1
+                if frame is not None:
+                    return (True, frame)
+
+    def release(self) -> None:
+        self.position = 0
+
+
+class SyntheticSource(FrameSource):
+    def __init__(self, width: int = 640, height: int = 480, frames: int = None, seed: int = 0, generator=None) -> None:
+        """Initialize a source generating the frames in memory, to run reproducible benchmarks without a camera.
+        By default, the frames are a moving gradient with some noise, always the same for a given seed.
+
+        Args:
+            width (int, optional): The width of the frames. Defaults to 640.
+            height (int, optional): The height of the frames. Defaults to 480.
+            frames (int, optional): The number of frames. Defaults to None (endless).
+            seed (int, optional): The seed of the noise. Defaults to 0.
+            generator (function, optional): Called with the frame number to generate a frame instead (a BGR np.ndarray). Defaults to None.
+        """
+
+        # Initialize class variables.
+        self.width = width
+        self.height = height
+        self.frames = frames
+        self.seed = seed
+        self.generator = generator if generator is not None else self._generate
+        self.position = 0
+        self.lock = threading.Lock()
+
+        # Precompute the gradient and the noise, so the frames are generated quickly.
+        self.gradient = None
+        self.noise = None
+
+    def read(self) -> tuple:
+        with self.lock:
+            if self.frames is not None and self.position >= self.frames:
+                return (False, None)
+            index = self.position
+            self.position += 1
+        return (True, self.generator(index))
+
+    def release(self) -> None:
+        self.position = 0
+
+    def _generate(self, index: int) -> np.ndarray:
+        """Generate the frame of the default generator.
+
+        Args:
+            index (int): The frame number.
+
+        Returns:
+            np.ndarray: The BGR frame.
+        """
+        if self.gradient is None:
+            (x, y) = np.meshgrid(np.arange(self.width), np.arange(self.height))
+            self.gradient = np.stack([(x + y) % 256, (2 * x) % 256, (2 * y) % 256], axis=-1).astype(np.uint8)
+            self.noise = np.random.default_rng(self.seed).integers(0, 32, self.gradient.shape, dtype=np.uint8)
+
+        # Move the gradient by a few pixels every frame.
+        return cv2.add(np.roll(self.gradient, 4 * index, axis=1), self.noise)
+
+
 class Camera(object):
-    def __init__(self, camera_index: int = -1, scale: float = 1) -> None:
+    def __init__(self, camera_index: int = -1, scale: float = 1, session: CaptureSession = None) -> None:
         """Initialize the camera.
 
         Args:
             camera_index (int, optional): Specify the camera index. Defaults to 0.
+            session (CaptureSession, optional): A capture session shared with other components, or any FrameSource (a video file, a directory of images...). Defaults to None.
         """
 
         # Initialize the camera.
-        if camera_index == -1:
+        if session is not None:
+            # Use the camera of the shared session.
+            self.camera_index = session.camera_index
+        elif camera_index == -1:
             # Get the first camera available if none is specified.
             cameras_available = CameraUtils.list_cameras()
             self.camera_index = cameras_available[0]
@@ -40,149 +570,211 @@ class Camera(object):
 
         # Initialize class variables.
         self.max_clear_int = -1
+        self.session = session
         self.scale = scale
         self.scale_factor = 0.025
 
-    def capture(self) -> cv2.VideoCapture:
-        """Capture the frame from the camera.
+        # Size (in bytes) of the last ASCII frame.
+        self.frame_bytes = 0
+
+    def capture(self) -> CaptureSession:
+        """Get the capture session of the camera, opening it the first time.
 
         Returns:
-            cv2.VideoCapture: The frame.
+            CaptureSession: The opened capture session.
         """
 
-        # Capture the frame using OpenCv python module.
-        capture = cv2.VideoCapture(self.camera_index)
-        time.sleep(1)
-        return capture
+        # Create the session if none was shared with the camera.
+        if self.session is None:
+            self.session = CaptureSession(self.camera_index)
+
+        # Open the session (does nothing if it is already opened).
+        return self.session.open()
 
-    def get_normal_frame(self, capture: cv2.VideoCapture) -> cv2.VideoCapture:
-        """Get the frame from the camera.
+    def get_frames(self, capture: CaptureSession) -> tuple:
+        """Get the normal and the gray frames from a single read of the camera.
 
         Args:
-            capture (cv2.VideoCapture): The capture object.
+            capture (CaptureSession): The capture object.
 
         Returns:
-            cv2.VideoCapture: The frame.
+            cv2.Frame: The normal frame (None if no frame was read, e.g. once a frame source is exhausted).
+            cv2.Frame: The gray frame, derived from the same normal frame (None if no frame was read).
         """
 
         # Get the frame from the camera.
         (ret, frame) = capture.read()
+        if not ret or frame is None:
+            return (None, None)
 
-        # Resizing the frame.
-        fx = self.scale_factor * self.scale + 0.02 * self.scale
-        fy = self.scale_factor * self.scale
-        frame = cv2.resize(frame, (0, 0), fx=fx, fy=fy)
-
-        # Flip the frame.
-        frame = cv2.flip(frame, 1)
+        # Return the converted frames.
+        return self.convert_frame(frame)
 
-        # Return the frame.
-        return frame
-
-    def get_gray_frame(self, capture: cv2.VideoCapture) -> cv2.VideoCapture:
-        """Get the gray frame from the camera.
+    def convert_frame(self, frame: np.ndarray) -> tuple:
+        """Resize and flip a frame, and convert it to gray.
 
         Args:
-            frame (cv2.Frame): The normal frame.
+            frame (np.ndarray): The BGR frame, as read from the camera or any frame source.
 
         Returns:
-            cv2.Frame: The gray frame.
-        """        """"""
-
-        # Get the frame from the camera.
-        (ret, frame) = capture.read()
+            np.ndarray: The normal frame.
+            np.ndarray: The gray frame, derived from the normal frame.
+        """
 
         # Resizing the frame.
         fx = self.scale_factor * self.scale + 0.02 * self.scale
         fy = self.scale_factor * self.scale
         frame = cv2.resize(frame, (0, 0), fx=fx, fy=fy)
 
-        # Flip the frame.
-        frame = cv2.flip(frame, 1)
+        # Flip the frame (in place, the resized frame is already a new buffer).
+        cv2.flip(frame, 1, dst=frame)
 
         # Convert the frame to gray.
         gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
 
-        # Return the frame.
-        return gray_frame
+        # Return the frames.
+        return (frame, gray_frame)
+
+    def iter_frames(self):
+        """Stream the normal and the gray frames of the camera (or of the frame source), until it is exhausted.
 
-    def get_ascii_frame(self, normal_frame: cv2.VideoCapture, gray_frame: cv2.VideoCapture, color: bool = True) -> str:
+        Yields:
+            np.ndarray: The normal frame.
+            np.ndarray: The gray frame.
+        """
+        for frame in self.capture():
+            yield self.convert_frame(frame)
+
+    def stream(self, color: bool = True, palette: str = "truecolor"):
+        """Stream the ASCII frames of the camera (or of the frame source), until it is exhausted.
+
+        Args:
+            color (bool, optional): If the ASCII frames should be colored. Defaults to True.
+            palette (str, optional): The colors used by the terminal: "truecolor", "256" or "16". Defaults to "truecolor".
+
+        Yields:
+            str: The ASCII frame.
+        """
+        for (normal_frame, gray_frame) in self.iter_frames():
+            yield self.get_ascii_frame(normal_frame, gray_frame, color, palette)
+
+    def get_normal_frame(self, capture: CaptureSession) -> cv2.VideoCapture:
+        """Get the frame from the camera. Prefer get_frames() when the gray frame is needed too.
+
+        Args:
+            capture (CaptureSession): The capture object.
+
+        Returns:
+            cv2.VideoCapture: The frame.
+        """
+        return self.get_frames(capture)[0]
+
+    def get_gray_frame(self, capture: CaptureSession) -> cv2.VideoCapture:
+        """Get the gray frame from the camera. Prefer get_frames() when the normal frame is needed too.
+
+        Args:
+            capture (CaptureSession): The capture object.
+
+        Returns:
+            cv2.Frame: The gray frame.
+        """
+        return self.get_frames(capture)[1]
+
+    def get_ascii_frame(self, normal_frame: cv2.VideoCapture, gray_frame: cv2.VideoCapture, color: bool = True, palette: str = "truecolor") -> str:
         """Get the ASCII frame from the camera.
 
         Args:
             normal_frame (cv2.Frame): The normal frame.
             gray_frame (cv2.Frame): The gray frame.
             color (bool, optional): If the ASCII frame should be colored. Defaults to True.
+            palette (str, optional): The colors used by the terminal: "truecolor", "256" or "16". Defaults to "truecolor".
 
         Returns:
             str: The ASCII frame.
         """
 
-        # Initialize the final frame by creating an empty new string.
-        final_frame = ""
+        # Convert the whole gray frame to ASCII characters in one step.
+        chars = CameraUtils.get_ascii_lut()[np.asarray(gray_frame, dtype=np.uint8)]
 
-        # Loop through the frame.
-        row_number = 0
-        for row in normal_frame:
-            line_number = 0
-
-            for pixel in row:
-
-                # Convert to ascii characters.
-                if color:
-
-                    # Get the color escape sequence and add it to the final frame. (Using colors)
-                    color_escaped = CameraUtils.get_color_escape(
-                        pixel[2], pixel[1], pixel[0])
-                    final_frame += f"""{color_escaped}{CameraUtils.convert_ascii(gray_frame[row_number][line_number])}\033[0m"""
-                else:
-
-                    # Add the ascii character to the final frame. (Without colors)
-                    final_frame += CameraUtils.convert_ascii(
-                        gray_frame[row_number][line_number])
-                line_number += 1
+        # Build the final frame, with or without colors.
+        if color:
+            final_frame = CameraUtils.render_colored(
+                chars, normal_frame, palette)
+        else:
+            final_frame = CameraUtils.render_plain(chars)
 
-            # Add a new line to the final frame to add the next values.
-            if len(row) != 0:
-                final_frame += "\n"
-            row_number += 1
+        # Keep the size of the frame so the output can be measured. (Every character is ASCII, one byte each)
+        self.frame_bytes = len(final_frame)
 
         # Return the final frame.
         return final_frame
 
-    def save_ascii_image(self, ascii_frame: str, file_name: str = "ascii_image") -> None:
+    def save_ascii_image(self, ascii_frame: str, file_name: str = "ascii_image", normal_frame: np.ndarray = None) -> None:
         """Save the ASCII frame as an image using Pillow (PIL).
 
         Args:
-            ascii_frame (str): The ASCII frame.
+            ascii_frame (str): The ASCII frame (without colors).
             file_name (str, optional): The file name. Defaults to "ascii_image".
+            normal_frame (np.ndarray, optional): The BGR frame giving the color of each character. Defaults to None (white characters).
         """
 
-        # Initialize the font.
-        font = ImageFont.truetype(
-            "./resources/fonts/CartographCF-DemiBold.ttf", 55)
+        # Draw the image.
+        img = CameraUtils.render_ascii_image(ascii_frame, normal_frame)
 
-        # Create the image.
-        img = Image.new("RGB", (1920 * self.scale, 875 *
-                        self.scale), color=(0, 0, 0))
-
-        # Draw the text.
-        draw = ImageDraw.Draw(img)
-        draw.text((0, 0), ascii_frame, (255, 255, 255), font=font)
-
-        # Save the image.
-        img.save(f"./saves/{file_name}.png")
+        # Save the image. (A low compression level keeps the encoding fast)
+        img.save(f"./saves/{file_name}.png", compress_level=1)
 
         # Open the image.
         os.system(f'open ./saves/{file_name}.png')
 
 
+class OpenCVCameraBackend(object):
+    """Camera backend probing the real devices with OpenCV.
+    """
+
+    def candidates(self) -> list:
+        """List the camera indices worth probing.
+
+        Returns:
+            list: The camera indices.
+        """
+
+        # On Linux, only probe the video devices that actually exist.
+        if platform.system() == "Linux":
+            indices = []
+            for path in glob.glob("/dev/video*"):
+                suffix = path[len("/dev/video"):]
+                if suffix.isdigit():
+                    indices.append(int(suffix))
+            return sorted(indices)
+
+        # Elsewhere, probe the first ten indices.
+        return list(range(10))
+
+    def probe(self, index: int) -> bool:
+        """Check if a camera works by reading a frame from it.
+
+        Args:
+            index (int): The camera index.
+
+        Returns:
+            bool: True if the camera works, False otherwise.
+        """
+        cap = None
+        try:
+            cap = cv2.VideoCapture(index)
+            return cap.read()[0]
+        finally:
+            if cap is not None:
+                cap.release()
+
+
 class CameraUtils(object):
 
     # <----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------- #
     # Color look-up table used to convert RGB to ANSI escape sequences.
     # So we can use colors in the terminal to make the ASCII image look better.
-    # Maybe I won't use it in the future, but I'll keep it here for now.
+    # It is used by the "256" and "16" palettes of the colored renderer.
     # You can get more info: https://en.wikipedia.org/wiki/ANSI_escape_code#8-bit
 
     CLUT = [
@@ -456,6 +1048,34 @@ class CameraUtils(object):
 
     # <----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------- #
 
+    # Characters used to draw the ASCII frame, from the darkest to the brightest.
+    ASCII_CHARS = "  .:-=+*#%@"
+
+    # Look-up tables built once and shared by every frame conversion.
+    _ascii_lut = None
+    _number_lut = None
+    _palette_cubes = {}
+    _palette_escapes = {}
+
+    # Font used to draw the ASCII images and glyph atlases already rasterized with it, by font size.
+    FONT_PATH = "./resources/fonts/CartographCF-DemiBold.ttf"
+    _glyph_atlases = {}
+
+    # Palettes supported by the colored renderer.
+    PALETTES = ("truecolor", "256", "16")
+
+    # Extensions of the image files read by OpenCV.
+    IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp")
+
+    # Backend used to discover the cameras and cache of the last discovery (backend, time, cameras).
+    camera_backend = OpenCVCameraBackend()
+    _cameras_cache = None
+    _cameras_lock = threading.Lock()
+
+    # Devices (backend, index) whose probe has not returned yet, they are not probed again until it does.
+    _probing = set()
+    _probing_lock = threading.Lock()
+
     @staticmethod
     def get_color_escape(r: int, g: int, b: int, background: bool = False) -> str:
         """Get the escape sequence for a color.
@@ -472,23 +1092,128 @@ class CameraUtils(object):
         return '\033[{};2;{};{};{}m'.format(48 if background else 38, r, g, b)
 
     @staticmethod
-    def list_cameras() -> list:
-        """List all available cameras using OpenCV.
+    def list_cameras(timeout: float = 1.0, ttl: float = 60.0, backend=None) -> list:
+        """List all available cameras. The devices are probed in parallel and the result is cached.
+
+        Args:
+            timeout (float, optional): Maximum time (in seconds) given to each device to answer. Defaults to 1.0.
+            ttl (float, optional): Time (in seconds) during which the cached result is reused. Defaults to 60.0.
+            backend (optional): The camera backend to use. Defaults to CameraUtils.camera_backend.
 
         Returns:
             list: List of cameras.
         """
 
-        # Try to open each camera and check if it works. If it does, add it to the list.
-        cameras = []
-        for i in range(10):
-            cap = cv2.VideoCapture(i)
-            if cap.read()[0]:
-                cameras.append(i)
-            cap.release()
+        if backend is None:
+            backend = CameraUtils.camera_backend
+
+        with CameraUtils._cameras_lock:
+            # Reuse the cached result if it is still fresh.
+            cache = CameraUtils._cameras_cache
+            if cache is not None and cache[0] is backend and time.monotonic() - cache[1] < ttl:
+                return list(cache[2])
+
+            # Skip the devices still busy with a probe that timed out during a previous discovery.
+            with CameraUtils._probing_lock:
+                candidates = [i for i in backend.candidates() if (backend, i) not in CameraUtils._probing]
+                CameraUtils._probing.update((backend, i) for i in candidates)
+
+            # Probe every candidate at the same time, giving up on the ones that do not answer in time.
+            cameras = []
+            if candidates:
+                executor = ThreadPoolExecutor(max_workers=len(candidates))
+                futures = {executor.submit(CameraUtils._probe, backend, i): i for i in candidates}
+                done, _ = wait(futures, timeout=timeout)
+                executor.shutdown(wait=False)
+
+                # Keep the cameras that work, in index order.
+                cameras = sorted(futures[future] for future in done
+                                 if future.exception() is None and future.result())
+
+            # Cache the result.
+            CameraUtils._cameras_cache = (backend, time.monotonic(), cameras)
 
         # Return the list of cameras.
-        return cameras
+        return list(cameras)
+
+    @staticmethod
+    def _probe(backend, index: int) -> bool:
+        """Probe a device, and mark it as available for the next probes once done.
+
+        Args:
+            backend: The camera backend.
+            index (int): The camera index.
+
+        Returns:
+            bool: True if the camera works, False otherwise.
+        """
+        try:
+            return backend.probe(index)
+        finally:
+            with CameraUtils._probing_lock:
+                CameraUtils._probing.discard((backend, index))
+
+    @staticmethod
+    def invalidate_cameras_cache() -> None:
+        """Forget the cached list of cameras, so the next call to list_cameras probes the devices again.
+        """
+        with CameraUtils._cameras_lock:
+            CameraUtils._cameras_cache = None
+
+    @staticmethod
+    def list_images(path: str, recursive: bool = False) -> list:
+        """List the image files of a path.
+
+        Args:
+            path (str): The path of an image file, or of a directory of images.
+            recursive (bool, optional): Also list the images of the subdirectories. Defaults to False.
+
+        Returns:
+            list: The paths of the image files, sorted.
+        """
+        if not os.path.isdir(path):
+            return [path]
+
+        paths = []
+        for (directory, directories, file_names) in os.walk(path):
+            paths.extend(os.path.join(directory, file_name) for file_name in file_names
+                         if file_name.lower().endswith(CameraUtils.IMAGE_EXTENSIONS))
+            if not recursive:
+                break
+        return sorted(paths)
+
+    @staticmethod
+    def load_frames(path: str):
+        """Load recorded frames, from a video file or a directory of images (the files that cannot be read are skipped).
+
+        Args:
+            path (str): The path of the video file or of the directory.
+
+        Yields:
+            np.ndarray: The frames.
+        """
+        source = ImageDirectorySource(path) if os.path.isdir(path) else VideoFileSource(path)
+        with source:
+            yield from source
+
+    @staticmethod
+    def open_source(source, **kwargs):
+        """Create the frame source matching a description.
+
+        Args:
+            source: A camera index (int or digits), "synthetic", the path of a directory of images or the path of a video file.
+            **kwargs: The options of the source.
+
+        Returns:
+            The frame source (a CaptureSession for a camera).
+        """
+        if isinstance(source, int) or str(source).isdigit():
+            return CaptureSession(int(source), **kwargs)
+        if source == "synthetic":
+            return SyntheticSource(**kwargs)
+        if os.path.isdir(source):
+            return ImageDirectorySource(source, **kwargs)
+        return VideoFileSource(source, **kwargs)
 
     @staticmethod
     def convert_ascii(pixel: int) -> str:
@@ -502,7 +1227,7 @@ class CameraUtils(object):
         """
 
         # Defining the characters to use.
-        chars = "  .:-=+*#%@"
+        chars = CameraUtils.ASCII_CHARS
 
         # Convert the pixel value to a brightness value.
         brightness = pixel / 255.0
@@ -513,6 +1238,270 @@ class CameraUtils(object):
         # Return the character.
         return chars[chars_index]
 
+    @staticmethod
+    def get_ascii_lut() -> np.ndarray:
+        """Get the look-up table converting every gray level (0-255) to an ASCII character.
+
+        Returns:
+            np.ndarray: The 256 ASCII characters, indexed by gray level.
+        """
+
+        # Build the look-up table the first time it is needed.
+        if CameraUtils._ascii_lut is None:
+            CameraUtils._ascii_lut = np.array(
+                [CameraUtils.convert_ascii(level) for level in range(256)], dtype=object)
+
+        # Return the look-up table.
+        return CameraUtils._ascii_lut
+
+    @staticmethod
+    def get_number_lut() -> np.ndarray:
+        """Get the look-up table converting every color level (0-255) to its decimal string.
+
+        Returns:
+            np.ndarray: The 256 decimal strings, indexed by color level.
+        """
+
+        # Build the look-up table the first time it is needed.
+        if CameraUtils._number_lut is None:
+            CameraUtils._number_lut = np.array(
+                [str(level) for level in range(256)], dtype=object)
+
+        # Return the look-up table.
+        return CameraUtils._number_lut
+
+    @staticmethod
+    def render_plain(chars: np.ndarray) -> str:
+        """Join a frame of ASCII characters into lines.
+
+        Args:
+            chars (np.ndarray): The ASCII characters, one per pixel.
+
+        Returns:
+            str: The ASCII frame.
+        """
+
+        # Nothing to draw if the frame has no column.
+        if chars.ndim != 2 or chars.shape[1] == 0:
+            return ""
+
+        # Join each row and add a new line after it.
+        return "".join(["".join(row) + "\n" for row in chars.tolist()])
+
+    @staticmethod
+    def render_colored(chars: np.ndarray, normal_frame: np.ndarray, palette: str = "truecolor") -> str:
+        """Join a frame of ASCII characters into lines colored with escape sequences.
+        An escape sequence is only emitted when the color changes along a line and the color is reset once per line.
+
+        Args:
+            chars (np.ndarray): The ASCII characters, one per pixel.
+            normal_frame (np.ndarray): The BGR frame giving the color of each character.
+            palette (str, optional): The colors used by the terminal: "truecolor", "256" or "16". Defaults to "truecolor".
+
+        Returns:
+            str: The colored ASCII frame.
+        """
+
+        # Nothing to draw if the frame has no column.
+        if chars.ndim != 2 or chars.shape[1] == 0:
+            return ""
+
+        # Get the color code of every character and the escape sequence of every changing one.
+        codes = CameraUtils.get_color_codes(normal_frame, palette)
+        changed = np.ones(codes.shape, dtype=bool)
+        changed[:, 1:] = codes[:, 1:] != codes[:, :-1]
+        rows, columns = np.nonzero(changed)
+
+        # Prefix only those characters with their color escape sequence.
+        cells = chars.copy()
+        cells[rows, columns] = CameraUtils.get_color_escapes(
+            codes[rows, columns], palette) + chars[rows, columns]
+
+        # Join each row, reset the color at its end and add a new line after it.
+        return "".join(["".join(row) + "\033[0m\n" for row in cells.tolist()])
+
+    @staticmethod
+    def get_color_codes(normal_frame: np.ndarray, palette: str = "truecolor") -> np.ndarray:
+        """Get the color code of every pixel for a palette.
+
+        Args:
+            normal_frame (np.ndarray): The BGR frame.
+            palette (str, optional): "truecolor" (packed RGB value), "256" or "16" (palette index). Defaults to "truecolor".
+
+        Returns:
+            np.ndarray: The color codes, one per pixel.
+        """
+
+        frame = np.asarray(normal_frame, dtype=np.uint8)
+
+        # Pack the RGB value so the colors can be compared in one step.
+        if palette == "truecolor":
+            return (frame[:, :, 2].astype(np.int32) << 16) | (
+                frame[:, :, 1].astype(np.int32) << 8) | frame[:, :, 0]
+
+        # Look up the palette index of every pixel in the precomputed cube.
+        cube = CameraUtils.get_palette_cube(palette)
+        return cube[frame[:, :, 2] >> 3, frame[:, :, 1] >> 3, frame[:, :, 0] >> 3]
+
+    @staticmethod
+    def get_color_escapes(codes: np.ndarray, palette: str = "truecolor") -> np.ndarray:
+        """Get the foreground escape sequences of color codes.
+
+        Args:
+            codes (np.ndarray): The color codes, as returned by get_color_codes.
+            palette (str, optional): The palette of the codes. Defaults to "truecolor".
+
+        Returns:
+            np.ndarray: The escape sequences.
+        """
+
+        # Build the truecolor escape sequences from the packed RGB values.
+        if palette == "truecolor":
+            numbers = CameraUtils.get_number_lut()
+            return "\033[38;2;" + numbers[codes >> 16] + ";" + \
+                numbers[(codes >> 8) & 0xff] + ";" + numbers[codes & 0xff] + "m"
+
+        # Get the escape sequences of the palette indices from the look-up table.
+        if palette not in CameraUtils._palette_escapes:
+            if palette == "256":
+                escapes = ["\033[38;5;{}m".format(i) for i in range(256)]
+            elif palette == "16":
+                escapes = ["\033[{}m".format(30 + i if i < 8 else 90 + i - 8) for i in range(16)]
+            else:
+                raise ValueError(f"Unknown palette: {palette}")
+            CameraUtils._palette_escapes[palette] = np.array(escapes, dtype=object)
+        return CameraUtils._palette_escapes[palette][codes]
+
+    @staticmethod
+    def get_palette_cube(palette: str) -> np.ndarray:
+        """Get the cube converting RGB colors (5 bits per channel) to the nearest palette index of the CLUT.
+        It is built once, so no nearest-color search is done per pixel.
+
+        Args:
+            palette (str): "256" (the 240 colors of the CLUT after the 16 system ones) or "16" (the system colors).
+
+        Returns:
+            np.ndarray: The 32x32x32 cube of palette indices, indexed by [r >> 3, g >> 3, b >> 3].
+        """
+
+        if palette not in CameraUtils._palette_cubes:
+            # Select the entries of the CLUT used by the palette.
+            if palette == "256":
+                entries = CameraUtils.CLUT[16:]
+            elif palette == "16":
+                entries = CameraUtils.CLUT[:16]
+            else:
+                raise ValueError(f"Unknown palette: {palette}")
+
+            # Center of every bin of the cube, for each channel.
+            levels = np.arange(32, dtype=np.int32) * 8 + 4
+            r = levels[:, None, None]
+            g = levels[None, :, None]
+            b = levels[None, None, :]
+
+            # Keep, for every bin, the palette entry with the smallest distance.
+            cube = np.zeros((32, 32, 32), dtype=np.uint8)
+            best = np.full((32, 32, 32), np.iinfo(np.int32).max, dtype=np.int32)
+            for (index, hex_color) in entries:
+                pr, pg, pb = (int(hex_color[i:i + 2], 16) for i in (0, 2, 4))
+                distance = (r - pr) ** 2 + (g - pg) ** 2 + (b - pb) ** 2
+                closer = distance < best
+                best[closer] = distance[closer]
+                cube[closer] = int(index)
+
+            CameraUtils._palette_cubes[palette] = cube
+
+        # Return the cube.
+        return CameraUtils._palette_cubes[palette]
+
+    @staticmethod
+    def get_glyph_atlas(font_size: int = 55) -> tuple:
+        """Get the atlas of the characters of ASCII_CHARS rasterized with the font. It is built once per font size.
+
+        Args:
+            font_size (int, optional): The font size. Defaults to 55.
+
+        Returns:
+            np.ndarray: The glyph bitmaps, of shape (number of glyphs, cell height, cell width).
+            np.ndarray: The glyph index of every ASCII code (0-255), blank for the characters missing from the atlas.
+        """
+
+        if font_size not in CameraUtils._glyph_atlases:
+            # Initialize the font.
+            font = ImageFont.truetype(CameraUtils.FONT_PATH, font_size)
+
+            # Every glyph is drawn in a cell large enough for all of them.
+            glyphs = sorted(set(CameraUtils.ASCII_CHARS))
+            (ascent, descent) = font.getmetrics()
+            cell_width = int(np.ceil(max(font.getlength(glyph) for glyph in glyphs)))
+            cell_height = ascent + descent
+
+            # Rasterize each glyph once.
+            atlas = np.zeros((len(glyphs), cell_height, cell_width), dtype=np.uint8)
+            for (index, glyph) in enumerate(glyphs):
+                img = Image.new("L", (cell_width, cell_height), color=0)
+                ImageDraw.Draw(img).text((0, 0), glyph, 255, font=font)
+                atlas[index] = np.asarray(img)
+
+            # Map every ASCII code to its glyph, the space being the blank glyph.
+            glyph_index = np.full(256, glyphs.index(" "), dtype=np.intp)
+            for (index, glyph) in enumerate(glyphs):
+                glyph_index[ord(glyph)] = index
+
+            CameraUtils._glyph_atlases[font_size] = (atlas, glyph_index)
+
+        # Return the atlas.
+        return CameraUtils._glyph_atlases[font_size]
+
+    @staticmethod
+    def render_ascii_image(ascii_frame: str, normal_frame: np.ndarray = None, font_size: int = 55) -> Image.Image:
+        """Draw an ASCII frame as an image by tiling the glyphs of the atlas. The image is sized to the frame.
+
+        Args:
+            ascii_frame (str): The ASCII frame (without colors).
+            normal_frame (np.ndarray, optional): The BGR frame giving the color of each character. Defaults to None (white characters).
+            font_size (int, optional): The font size. Defaults to 55.
+
+        Returns:
+            Image.Image: The image.
+
+        Raises:
+            ValueError: If the frame is empty (an image cannot be 0 pixels wide or high).
+        """
+
+        # Get the glyph index of every character, padding the short lines with blanks.
+        lines = ascii_frame.split("\n")
+        if lines and lines[-1] == "":
+            lines.pop()
+        width = max((len(line) for line in lines), default=0)
+        codes = np.full((len(lines), width), ord(" "), dtype=np.uint8)
+        for (row, line) in enumerate(lines):
+            codes[row, :len(line)] = np.frombuffer(line.encode("ascii", "replace"), dtype=np.uint8)
+
+        # An empty frame has no image (PNG and most formats cannot store one).
+        (rows, columns) = codes.shape
+        if rows == 0 or columns == 0:
+            raise ValueError("Cannot render an empty ASCII frame")
+
+        (atlas, glyph_index) = CameraUtils.get_glyph_atlas(font_size)
+        (_, cell_height, cell_width) = atlas.shape
+
+        # Tile the glyph bitmaps, one per character.
+        tiles = atlas[glyph_index[codes]].transpose(0, 2, 1, 3)
+
+        # Draw white characters.
+        glyphs = np.ascontiguousarray(tiles).reshape(rows * cell_height, columns * cell_width)
+        if normal_frame is None:
+            return Image.fromarray(glyphs, "L")
+
+        # Tint each glyph with the color of its character. (Blank cells stay black if the frame is smaller)
+        colors = np.zeros((rows, columns, 3), dtype=np.uint8)
+        frame = np.asarray(normal_frame, dtype=np.uint8)[:rows, :columns, ::-1]
+        colors[:frame.shape[0], :frame.shape[1]] = frame
+        colors = cv2.resize(colors, (glyphs.shape[1], glyphs.shape[0]), interpolation=cv2.INTER_NEAREST)
+        pixels = cv2.multiply(cv2.cvtColor(glyphs, cv2.COLOR_GRAY2RGB), colors, scale=1 / 255)
+        return Image.fromarray(pixels, "RGB")
+
     @staticmethod
     def get_window_size() -> tuple:
         """Get the size of the terminal window.
@@ -522,8 +1511,8 @@ class CameraUtils(object):
             int: The number of columns.
         """
 
-        # Get the size of the terminal window.
-        rows, columns = os.popen("stty size", "r").read().split()
+        # Get the size of the terminal window. (Without spawning a process, so it can be called for every frame)
+        columns, rows = shutil.get_terminal_size()
 
         # Return the size.
         return (int(rows), int(columns))
@@ -586,9 +1575,9 @@ if __name__ == "__main__":
     for i in range(1):
         cam = Camera(scale=5)
         capture = cam.capture()
-        normal_frame = cam.get_normal_frame(capture)
-        gray_frame = cam.get_gray_frame(capture)
+        normal_frame, gray_frame = cam.get_frames(capture)
         ascii_frame = cam.get_ascii_frame(
             normal_frame, gray_frame, color=False)
         print(ascii_frame)
         cam.save_ascii_image(ascii_frame, f'test_cam_module.png')
+        capture.release()
@@ -0,0 +1,281 @@
+# PyxMap
+# Copyright © 2023 Cléry Arque-Ferradou, Nathanaël Lejuste, De Beaumont du Repaire Carla, Chasseigne Ulysse
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+import os
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+from camera import Camera, CameraUtils, VideoFileSource
+
+
+class Converter(object):
+    def __init__(self, output: str = "./saves/convert", scale: float = 5, text: bool = True, image: bool = False, color: bool = False, palette: str = "truecolor", workers: int = None, chunk_size: int = 8, progress=None) -> None:
+        """Initialize a batch converter, converting images and video frames to ASCII text and/or PNG images across a pool of processes.
+
+        Args:
+            output (str, optional): The output directory. Defaults to "./saves/convert".
+            scale (float, optional): Scale factor of the frames, as for the Camera. Defaults to 5.
+            text (bool, optional): Write the ASCII frames as text. Defaults to True.
+            image (bool, optional): Write the ASCII frames as PNG images. Defaults to False.
+            color (bool, optional): Color the ASCII frames (escape sequences in the text, colored characters in the images). Defaults to False.
+            palette (str, optional): The colors of the text: "truecolor", "256" or "16". Defaults to "truecolor".
+            workers (int, optional): The number of processes. Defaults to None (one per core).
+            chunk_size (int, optional): The number of frames sent to a process at once. Defaults to 8.
+            progress (function, optional): Called with the number of frames converted so far after each chunk. Defaults to None.
+        """
+
+        # Initialize class variables.
+        self.output = output
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.options = {
+            "output": output,
+            "scale": scale,
+            "text": text,
+            "image": image,
+            "color": color,
+            "palette": palette
+        }
+        self.converted = 0
+        self.failed = []
+
+    def convert(self, paths: list) -> int:
+        """Convert images, directories of images and videos.
+        The outputs are named after the path of the inputs relative to their root: "photo" for a file, "photos/photo" for an image of a directory.
+
+        Args:
+            paths (list): The paths of the image files, directories and video files.
+
+        Raises:
+            ValueError: If an input does not exist, is not a video that can be opened, or several inputs would be written to the same output
+                (raised before anything is converted), or if some images could not be read (raised after converting the other ones).
+
+        Returns:
+            int: The number of frames converted.
+        """
+
+        # Never write empty outputs for inputs that do not exist.
+        missing = [path for path in paths if not os.path.exists(path)]
+        if missing:
+            raise ValueError(f"Some inputs do not exist: {', '.join(missing)}")
+
+        # Sort the inputs: the images are converted together, the videos one after the other.
+        images = []
+        videos = []
+        for path in paths:
+            if os.path.isdir(path):
+                root = os.path.dirname(os.path.abspath(path))
+                images.extend((Converter.get_name(image, root), image) for image in CameraUtils.list_images(path))
+            elif path.lower().endswith(CameraUtils.IMAGE_EXTENSIONS):
+                images.append((Converter.get_name(path), path))
+            else:
+                videos.append((Converter.get_name(path), path))
+
+        # Never let an output overwrite another one. (Ignoring the case, as some file systems do)
+        names = Counter(name.casefold() for (name, path) in images + videos)
+        collisions = sorted({name for (name, path) in images + videos if names[name.casefold()] > 1})
+        if collisions:
+            raise ValueError(f"Several inputs would be written to the same output: {', '.join(collisions)}")
+
+        # The files that are neither images nor videos are rejected.
+        unreadable = [path for (name, path) in videos if not Converter.is_video(path)]
+        if unreadable:
+            raise ValueError(f"Some inputs are neither images nor videos that can be read: {', '.join(unreadable)}")
+
+        # Create the output directories.
+        for name in {os.path.dirname(name) for (name, path) in images + videos}:
+            os.makedirs(os.path.join(self.output, name), exist_ok=True)
+
+        self.failed = []
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            if images:
+                self.convert_images(executor, images)
+            for (name, path) in videos:
+                self.convert_video(executor, path, name)
+
+        # Report the images that could not be read.
+        if self.failed:
+            raise ValueError(f"Some images could not be read: {', '.join(self.failed)}")
+
+        return self.converted
+
+    def convert_images(self, executor: ProcessPoolExecutor, images: list) -> None:
+        """Convert image files, each to its own text file and/or image. The images that cannot be read are added to failed.
+
+        Args:
+            executor (ProcessPoolExecutor): The pool of processes.
+            images (list): The (output name, path) pairs of the image files.
+        """
+
+        # The processes read the images themselves, only their paths are sent.
+        def chunks():
+            for start in range(0, len(images), self.chunk_size):
+                yield images[start:start + self.chunk_size]
+
+        paths = dict(images)
+
+        def write(results: list) -> None:
+            for (name, ascii_frame) in results:
+                if ascii_frame is None:
+                    self.failed.append(paths[name])
+                elif self.options["text"]:
+                    with open(os.path.join(self.output, f"{name}.txt"), "w") as f:
+                        f.write(ascii_frame)
+
+        self._run(executor, chunks(), write)
+
+    def convert_video(self, executor: ProcessPoolExecutor, path: str, name: str = None) -> None:
+        """Convert the frames of a video file, to one text file holding every frame in order (separated by an empty line) and/or one image per frame.
+
+        Args:
+            executor (ProcessPoolExecutor): The pool of processes.
+            path (str): The path of the video file.
+            name (str, optional): The output name. Defaults to None (the name of the file, without its extension).
+        """
+        name = name or Converter.get_name(path)
+        camera = Converter.get_camera(self.options["scale"])
+
+        # The frames are decoded here, in order, and resized before being sent to the processes.
+        def chunks():
+            chunk = []
+            with VideoFileSource(path) as source:
+                for (index, frame) in enumerate(source):
+                    chunk.append((f"{name}_{index:06d}", camera.convert_frame(frame)))
+                    if len(chunk) == self.chunk_size:
+                        yield chunk
+                        chunk = []
+            if chunk:
+                yield chunk
+
+        # The chunks are written in the order of the frames.
+        text_file = open(os.path.join(self.output, f"{name}.txt"), "w") if self.options["text"] else None
+        separator = ""
+
+        def write(results: list) -> None:
+            nonlocal separator
+            if text_file is not None:
+                for (frame_name, ascii_frame) in results:
+                    text_file.write(separator + ascii_frame)
+                    separator = "\n\n"
+
+        try:
+            self._run(executor, chunks(), write)
+        finally:
+            if text_file is not None:
+                text_file.close()
+
+    def _run(self, executor: ProcessPoolExecutor, chunks, write) -> None:
+        """Convert chunks of frames on the pool of processes and write the results in order.
+        Only a few chunks are in flight at once, so a long video is never held in memory.
+
+        Args:
+            executor (ProcessPoolExecutor): The pool of processes.
+            chunks (iterable): The chunks, lists of (name, frame) pairs where a frame is the path of an image or a (normal, gray) pair.
+            write (function): Writes the results of a chunk, a list of (name, ASCII frame) pairs. (The ASCII frame is None if the image could not be read)
+        """
+        pending = deque()
+
+        def write_next() -> None:
+            results = pending.popleft().result()
+            write(results)
+            self.converted += sum(1 for (name, ascii_frame) in results if ascii_frame is not None)
+            if self.progress is not None:
+                self.progress(self.converted)
+
+        for chunk in chunks:
+            # Wait for the oldest chunk when enough chunks are in flight.
+            if len(pending) >= 2 * self.workers:
+                write_next()
+            pending.append(executor.submit(convert_chunk, self.options, chunk))
+
+        while pending:
+            write_next()
+
+    @staticmethod
+    def get_name(path: str, root: str = None) -> str:
+        """Get the output name of an input file: its path relative to a root directory, without its extension.
+
+        Args:
+            path (str): The path of the input file.
+            root (str, optional): The root directory. Defaults to None (the directory of the file).
+
+        Returns:
+            str: The output name, with "/" between the directories.
+        """
+        name = os.path.basename(path) if root is None else os.path.relpath(os.path.abspath(path), root)
+        return os.path.splitext(name)[0].replace(os.sep, "/")
+
+    @staticmethod
+    def is_video(path: str) -> bool:
+        """Check if a file is a video that can be opened.
+
+        Args:
+            path (str): The path of the file.
+
+        Returns:
+            bool: True if the file can be opened as a video, False otherwise.
+        """
+        with VideoFileSource(path) as source:
+            return source.is_opened()
+
+    @staticmethod
+    def get_camera(scale: float) -> Camera:
+        """Get a camera used for its conversion pipeline only. (The device is never opened)
+
+        Args:
+            scale (float): Scale factor of the frames.
+
+        Returns:
+            Camera: The camera.
+        """
+        return Camera(camera_index=0, scale=scale)
+
+
+def convert_chunk(options: dict, chunk: list) -> list:
+    """Convert a chunk of frames to ASCII, in a process of the pool.
+
+    Args:
+        options (dict): The options of the Converter.
+        chunk (list): The (name, frame) pairs, where a frame is the path of an image or a (normal, gray) pair.
+
+    Returns:
+        list: The (name, ASCII frame) pairs, in the order of the chunk. The ASCII frame is None if the image could not be read.
+    """
+    camera = Converter.get_camera(options["scale"])
+
+    results = []
+    for (name, frame) in chunk:
+        # Read and resize the image.
+        if isinstance(frame, str):
+            image = cv2.imread(frame)
+            if image is None:
+                results.append((name, None))
+                continue
+            frame = camera.convert_frame(image)
+        (normal_frame, gray_frame) = frame
+
+        # Convert the frame, and draw it if wanted.
+        ascii_frame = camera.get_ascii_frame(normal_frame, gray_frame, color=options["color"] and options["text"], palette=options["palette"])
+        if options["image"]:
+            plain_frame = ascii_frame if not options["color"] else camera.get_ascii_frame(normal_frame, gray_frame, color=False)
+            img = CameraUtils.render_ascii_image(plain_frame, normal_frame if options["color"] else None)
+            img.save(os.path.join(options["output"], f"{name}.png"), compress_level=1)
+
+        results.append((name, ascii_frame))
+    return results
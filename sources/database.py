@@ -15,41 +15,153 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
-import os
-import json
-from google.cloud import firestore
-from google.oauth2 import service_account
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
+import numpy as np
+import json
+import os
+import struct
+import threading
+import time
 import uuid
 import random
+import zipfile
+import zlib
+from camera import CameraUtils
+from storage import FirestoreStorage, PyxpicAlreadyExists, Storage
 
 
-class Database(object):
+class PyxpicCache(object):
+    def __init__(self, max_size: int = 1024, ttl: float = 300.0) -> None:
+        """Initialize a LRU cache of pyxpics, bounded in size and in time.
 
-    def __init__(self) -> None:
-        """Initialize the database connection.
+        Args:
+            max_size (int, optional): The maximum number of entries, the least recently used ones are evicted first. Defaults to 1024.
+            ttl (float, optional): The time to live of an entry in seconds, None to keep the entries until they are evicted. Defaults to 300.0.
         """
-        self._initialize_firestore()
 
-    def _initialize_firestore(self) -> None:
-        """Initialize the firestore connection.
+        # Initialize class variables.
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        # Statistics.
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key):
+        """Get an entry and mark it as the most recently used.
+
+        Args:
+            key: The key of the entry.
+
+        Returns:
+            The value of the entry, None if it is not cached or expired.
         """
+        with self.lock:
+            item = self.entries.get(key)
+            if item is not None and item[1] is not None and item[1] <= time.monotonic():
+                del self.entries[key]
+                item = None
+
+            if item is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return item[0]
 
-        # Get the credentials from the json file.
-        credentials_file_path = os.path.join(
-            os.path.dirname(os.path.abspath(__file__)),
-            "resources", "database_credentials.json"
-        )
+    def put(self, key, value) -> None:
+        """Add or replace an entry, evicting the least recently used ones if the cache is full.
 
-        # Create the credentials.
-        with open(credentials_file_path, "r") as f:
-            credentials_raw = f.read()
-            credentials_json = json.loads(credentials_raw)
-            credentials = service_account.Credentials.from_service_account_info(
-                credentials_json)
+        Args:
+            key: The key of the entry.
+            value: The value of the entry.
+        """
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
 
-        # Create the firestore client.
-        self.db = firestore.Client(credentials=credentials)
+    def pop(self, key):
+        """Remove an entry.
+
+        Args:
+            key: The key of the entry.
+
+        Returns:
+            The value of the removed entry, None if it was not cached.
+        """
+        with self.lock:
+            item = self.entries.pop(key, None)
+        return item[0] if item is not None else None
+
+    def clear(self) -> None:
+        """Remove every entry.
+        """
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        """Get the statistics of the cache.
+
+        Returns:
+            dict: The number of hits, misses and evictions, the hit rate and the size of the cache.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self.entries)
+            }
+
+
+class Database(object):
+
+    # Fields describing a pyxpic, without its raw image.
+    METADATA_FIELDS = ("owner_id", "order_number", "date")
+
+    def __init__(self, backend: Storage = None, order_counter=None, cache: PyxpicCache = None, listen: bool = False) -> None:
+        """Initialize the database connection.
+
+        Args:
+            backend (Storage, optional): The storage backend. Defaults to a FirestoreStorage.
+            order_counter (optional): The counter allocating the order numbers. Defaults to the counter of the backend.
+            cache (PyxpicCache, optional): The read-through cache of the pyxpics and their decoded frames. Defaults to None (no cache).
+            listen (bool, optional): Invalidate the cache when the pyxpics are added by someone else, using a listener of the backend. Defaults to False.
+
+        Raises:
+            ValueError: If listen is True but the backend cannot listen to the changes of the pyxpics.
+        """
+        self.backend = backend if backend is not None else FirestoreStorage()
+        self.order_counter = order_counter if order_counter is not None else self.backend.order_counter
+        self.cache = cache
+        self.watch = None
+        if cache is not None and listen:
+            try:
+                self.watch = self.backend.watch(self._on_change)
+            except NotImplementedError:
+                raise ValueError(f"{type(self.backend).__name__} cannot listen to the changes of the pyxpics, use listen=False") from None
+
+    def close(self) -> None:
+        """Stop listening to the changes of the pyxpics.
+        """
+        if self.watch is not None:
+            self.watch.unsubscribe()
+            self.watch = None
 
     def get_pyxpic(self, pyxpic_id: str) -> dict:
         """Get a pyxpic from the database.
@@ -61,41 +173,82 @@ class Database(object):
             dict: The pyxpic data.
         """
 
-        # Get the pyxpic from the database.
-        doc_ref = self.db.collection("pyxpic").document(pyxpic_id)
+        # Get the pyxpic from the database and return its data.
+        if self.cache is None:
+            return self.backend.get(pyxpic_id)
 
-        # Return the pyxpic data.
-        doc = doc_ref.get()
-        return doc.to_dict()
+        entry = self._get_entry(pyxpic_id)
+        return dict(entry["data"]) if entry is not None else None
 
-    def add_pyxpic(self, pyxpic_id: str, owner_id: str, raw_image: list) -> str:
-        """Add a pyxpic to the database.
+    def get_pyxpic_frame(self, pyxpic_id: str) -> np.ndarray:
+        """Get the decoded frame of a pyxpic, as a matrix of characters.
 
         Args:
             pyxpic_id (str): The id of the pyxpic.
+
+        Returns:
+            np.ndarray: The matrix of characters, None if the pyxpic does not exist.
+        """
+
+        # Decode the raw image of the pyxpic.
+        if self.cache is None:
+            pyxpic = self.backend.get(pyxpic_id)
+            return DatabaseUtils.decode_raw_image_matrix(pyxpic["raw_image"]) if pyxpic is not None else None
+
+        # Keep the decoded frame in the cache, so it is only decoded once.
+        entry = self._get_entry(pyxpic_id)
+        if entry is None:
+            return None
+        if entry["frame"] is None:
+            entry["frame"] = DatabaseUtils.decode_raw_image_matrix(entry["data"]["raw_image"])
+        return entry["frame"]
+
+    def add_pyxpic(self, pyxpic_id: str, owner_id: str, raw_image: list, normal_frame: np.ndarray = None, exist_ok: bool = False) -> str:
+        """Add a pyxpic to the database. If the id is already used, the pyxpic is added with a new random id.
+
+        Args:
+            pyxpic_id (str): The id of the pyxpic. If None, a random id is created.
             owner_id (str): The id of the owner.
-            raw_image (list): The raw image data.
+            raw_image (list): The raw image data. An ASCII frame (str) is stored in the compact frame format.
+            normal_frame (np.ndarray, optional): The BGR frame giving the color of each character, stored with an ASCII frame. Defaults to None.
+            exist_ok (bool, optional): If the id is already used by a pyxpic of the same owner, consider it was added by a previous
+                attempt and keep it, so retrying the call does not add the pyxpic twice. Defaults to False.
         
         Returns:
             str: The pyxpic id.
         """
 
-        # Verify if the pyxpic id is already used.
+        # Encode the ASCII frames in the compact frame format.
+        if isinstance(raw_image, str):
+            raw_image = DatabaseUtils.encode_raw_image(raw_image, normal_frame)
+
+        # Create the pyxpic data.
+        data = {
+            "owner_id": owner_id,
+            "order_number": self.order_counter.allocate() if self.order_counter is not None else None,
+            "raw_image": raw_image,
+            "date": datetime.now()
+        }
+
+        # Add the pyxpic to the database. (The write itself fails if the id is already used, then a new id is tried)
+        if pyxpic_id is None:
+            pyxpic_id = DatabaseUtils.create_random_pyxpic_id()
         while True:
-            if self.is_uuid_already_used(pyxpic_id):
+            try:
+                self.backend.create(pyxpic_id, data)
+            except PyxpicAlreadyExists:
+                # A previous attempt already added it.
+                if exist_ok:
+                    existing = self.backend.get(pyxpic_id)
+                    if existing is not None and existing.get("owner_id") == owner_id:
+                        break
                 pyxpic_id = DatabaseUtils.create_random_pyxpic_id()
             else:
                 break
 
-        # Add the pyxpic to the database.
-        doc_ref = self.db.collection("pyxpic").document(pyxpic_id)
-        doc_ref.set(
-            {
-                "owner_id": owner_id,
-                "order_number": len(self.fetch_all_pyxpic()),
-                "raw_image": raw_image,
-                "date": datetime.now()
-            })
+        # The cached pyxpics of the owner are outdated.
+        if self.cache is not None:
+            self.cache.pop(("user", owner_id))
 
         return pyxpic_id
 
@@ -107,11 +260,9 @@ class Database(object):
             data (dict): The data to update.
         """
 
-        # Get the pyxpic from the database.
-        doc_ref = self.db.collection("pyxpic").document(pyxpic_id)
-
         # Update the pyxpic with the new data.
-        doc_ref.update(data)
+        self.backend.update(pyxpic_id, data)
+        self._invalidate(pyxpic_id, data)
 
     def delete_pyxpic(self, pyxpic_id: str) -> None:
         """Delete a pyxpic from the database.
@@ -120,11 +271,9 @@ class Database(object):
             pyxpic_id (str): The id of the pyxpic.
         """
 
-        # Get the pyxpic from the database.
-        doc_ref = self.db.collection("pyxpic").document(pyxpic_id)
-
-        # Delete the fetched pyxpic.
-        doc_ref.delete()
+        # Delete the pyxpic.
+        self.backend.delete(pyxpic_id)
+        self._invalidate(pyxpic_id)
 
     def fetch_all_pyxpic(self) -> dict:
         """Fetch all pyxpic from the database.
@@ -133,12 +282,8 @@ class Database(object):
             dict: The pyxpic data.
         """
 
-        # Get all the pyxpic from the database.
-        col_ref = self.db.collection("pyxpic")
-        docs = col_ref.stream()
-
         # Return the all pyxpic data in a dictionary.
-        return {doc.id: doc.to_dict() for doc in docs}
+        return self.backend.fetch_all()
 
     def fetch_user_pyxpic(self, user_id: str) -> dict:
         """Fetch all pyxpic from the database.
@@ -150,14 +295,271 @@ class Database(object):
             dict: The pyxpic data.
         """
 
-        # Get all the pyxpic collection.
-        col_ref = self.db.collection("pyxpic")
+        # Return the all pyxpic data of the user in a dictionary.
+        if self.cache is None:
+            return self.backend.fetch_user(user_id)
+
+        # Use the cached pyxpics of the user if they are all still cached.
+        pyxpic_ids = self.cache.get(("user", user_id))
+        if pyxpic_ids is not None:
+            pyxpics = {}
+            for pyxpic_id in pyxpic_ids:
+                entry = self.cache.get(pyxpic_id)
+                if entry is None:
+                    break
+                pyxpics[pyxpic_id] = dict(entry["data"])
+            else:
+                return pyxpics
 
-        # Select only the pyxpic of the user.
-        docs = col_ref.where("owner_id", "==", user_id).stream()
+        # Fetch the pyxpics of the user and cache them.
+        pyxpics = self.backend.fetch_user(user_id)
+        for (pyxpic_id, data) in pyxpics.items():
+            self.cache.put(pyxpic_id, {"data": data, "frame": None})
+        self.cache.put(("user", user_id), tuple(pyxpics))
+        return {pyxpic_id: dict(data) for (pyxpic_id, data) in pyxpics.items()}
 
-        # Return the all pyxpic data in a dictionary.
-        return {doc.id: doc.to_dict() for doc in docs}
+    def fetch_pyxpic_page(self, user_id: str = None, fields: list = None, order_by: str = "order_number", page_size: int = 100, cursor=None) -> tuple:
+        """Fetch a page of pyxpic from the database.
+
+        Args:
+            user_id (str, optional): Only fetch the pyxpic of this user. Defaults to None (every user).
+            fields (list, optional): The fields to fetch, for example Database.METADATA_FIELDS. Defaults to None (every field).
+            order_by (str, optional): The field ordering the pyxpic: "order_number" or "date". Defaults to "order_number".
+            page_size (int, optional): The maximum number of pyxpic in the page. Defaults to 100.
+            cursor (optional): The cursor returned with the previous page. Defaults to None (first page).
+
+        Returns:
+            dict: The pyxpic data.
+            The cursor of the next page, None if this page is the last one.
+        """
+
+        # Return the page and the cursor of the next one.
+        return self.backend.fetch_page(user_id, fields, order_by, page_size, cursor)
+
+    def iter_pyxpic(self, user_id: str = None, fields: list = None, order_by: str = "order_number", page_size: int = 100):
+        """Iterate over the pyxpic of the database, one page at a time, so the memory use stays bounded.
+
+        Args:
+            user_id (str, optional): Only fetch the pyxpic of this user. Defaults to None (every user).
+            fields (list, optional): The fields to fetch, for example Database.METADATA_FIELDS. Defaults to None (every field).
+            order_by (str, optional): The field ordering the pyxpic: "order_number" or "date". Defaults to "order_number".
+            page_size (int, optional): The number of pyxpic fetched at once. Defaults to 100.
+
+        Yields:
+            str: The id of the pyxpic.
+            dict: The pyxpic data.
+        """
+
+        cursor = None
+        while True:
+            # Fetch the next page.
+            (page, cursor) = self.fetch_pyxpic_page(user_id, fields, order_by, page_size, cursor)
+            yield from page.items()
+
+            # Stop after the last page.
+            if cursor is None:
+                return
+
+    def delete_pyxpics(self, user_id: str = None, batch_size: int = None, workers: int = 4, progress=None) -> int:
+        """Delete every pyxpic matching a query, in batched writes run concurrently.
+
+        Args:
+            user_id (str, optional): Only delete the pyxpic of this user. Defaults to None (every pyxpic).
+            batch_size (int, optional): The number of pyxpic deleted at once. Defaults to the batch limit of the backend.
+            workers (int, optional): The maximum number of batches written at the same time. Defaults to 4.
+            progress (function, optional): Called with the number of pyxpic deleted so far after each batch. Defaults to None.
+
+        Returns:
+            int: The number of pyxpic deleted.
+        """
+        batch_size = batch_size or self.backend.BATCH_SIZE
+
+        # List the ids only, one page per batch.
+        def batches():
+            cursor = None
+            while True:
+                (page, cursor) = self.fetch_pyxpic_page(user_id, [], page_size=batch_size, cursor=cursor)
+                if page:
+                    yield list(page)
+                if cursor is None:
+                    return
+
+        def delete_batch(pyxpic_ids: list) -> None:
+            self.backend.delete_many(pyxpic_ids)
+            for pyxpic_id in pyxpic_ids:
+                self._invalidate(pyxpic_id)
+
+        return self._run_batches(batches(), delete_batch, workers, progress)
+
+    def import_pyxpics(self, directory: str, owner_id: str = None, batch_size: int = None, workers: int = 4, progress=None) -> int:
+        """Import the pyxpics of a directory: an extracted export (pyxpics.json and the raw image of every pyxpic),
+        and the saved frames missing from it, ASCII frames (.txt) and encoded frames (.bin).
+        The exported pyxpics keep their id, owner and date (replacing the pyxpics with the same id), the saved frames get random ids.
+        The order numbers of every pyxpic are reserved at once, in the exported order then in file name order.
+        The pyxpics are added in batched writes run concurrently.
+
+        Args:
+            directory (str): The directory of the pyxpics.
+            owner_id (str, optional): The id of the owner of the saved frames missing from pyxpics.json. Defaults to None.
+            batch_size (int, optional): The number of pyxpic added at once. Defaults to the batch limit of the backend.
+            workers (int, optional): The maximum number of batches written at the same time. Defaults to 4.
+            progress (function, optional): Called with the number of pyxpic imported so far after each batch. Defaults to None.
+
+        Raises:
+            ValueError: If an exported pyxpic id is not a UUID, or if there are saved frames missing from pyxpics.json but no owner_id.
+
+        Returns:
+            int: The number of pyxpic imported.
+        """
+        batch_size = batch_size or self.backend.BATCH_SIZE
+
+        # Read the metadata of the exported pyxpics, in their original order.
+        metadata_path = os.path.join(directory, "pyxpics.json")
+        metadata = {}
+        if os.path.exists(metadata_path):
+            with open(metadata_path, "r") as f:
+                metadata = json.load(f)
+        entries = []
+        for (pyxpic_id, pyxpic) in sorted(metadata.items(), key=lambda item: (item[1].get("order_number") is None, item[1].get("order_number") or 0)):
+            Storage.validate_id(pyxpic_id)
+            file_name = f"{pyxpic_id}.bin" if os.path.exists(os.path.join(directory, f"{pyxpic_id}.bin")) else f"{pyxpic_id}.json"
+            entries.append((pyxpic_id, file_name, pyxpic))
+
+        # Add the saved frames missing from the metadata.
+        exported = {file_name for (_, file_name, _) in entries}
+        file_names = sorted(file_name for file_name in os.listdir(directory)
+                            if file_name.endswith((".txt", ".bin")) and file_name not in exported)
+        if file_names and owner_id is None:
+            raise ValueError("An owner_id is needed to import the saved frames missing from pyxpics.json")
+        for (pyxpic_id, file_name) in zip(DatabaseUtils.create_random_pyxpic_ids(len(file_names)), file_names):
+            entries.append((pyxpic_id, file_name, {"owner_id": owner_id}))
+
+        # Reserve the order numbers of every pyxpic at once.
+        first = self.order_counter.allocate(len(entries)) if self.order_counter is not None and entries else None
+
+        # Read the frames of a batch only when it is about to be written, so the memory use stays bounded.
+        def batches():
+            for start in range(0, len(entries), batch_size):
+                yield [(first + start + offset if first is not None else None, entry)
+                       for (offset, entry) in enumerate(entries[start:start + batch_size])]
+
+        def import_batch(batch: list) -> None:
+            pyxpics = {}
+            for (order_number, (pyxpic_id, file_name, pyxpic)) in batch:
+                path = os.path.join(directory, file_name)
+                if file_name.endswith(".txt"):
+                    with open(path, "r") as f:
+                        raw_image = DatabaseUtils.encode_raw_image(f.read())
+                elif file_name.endswith(".json"):
+                    with open(path, "r") as f:
+                        raw_image = json.load(f)
+                else:
+                    with open(path, "rb") as f:
+                        raw_image = f.read()
+                date = pyxpic.get("date")
+                pyxpics[pyxpic_id] = {
+                    "owner_id": pyxpic.get("owner_id", owner_id),
+                    "order_number": order_number,
+                    "raw_image": raw_image,
+                    "date": datetime.fromisoformat(date) if isinstance(date, str) else datetime.now()
+                }
+            self.backend.add_many(pyxpics)
+
+        imported = self._run_batches(batches(), import_batch, workers, progress)
+
+        # The cached pyxpics of the owners are outdated.
+        if self.cache is not None:
+            for owner in {pyxpic.get("owner_id", owner_id) for (_, _, pyxpic) in entries}:
+                self.cache.pop(("user", owner))
+
+        return imported
+
+    def export_pyxpics(self, path: str, user_id: str = None, page_size: int = 100, progress=None) -> int:
+        """Export the pyxpics to a zip archive: the raw image of every pyxpic ({id}.bin, or {id}.json for the legacy ones)
+        and their metadata (pyxpics.json). The pyxpics are read one page at a time, so the memory use stays bounded.
+
+        Args:
+            path (str): The path of the archive.
+            user_id (str, optional): Only export the pyxpic of this user. Defaults to None (every pyxpic).
+            page_size (int, optional): The number of pyxpic read at once. Defaults to 100.
+            progress (function, optional): Called with the number of pyxpic exported so far after each page. Defaults to None.
+
+        Returns:
+            int: The number of pyxpic exported.
+
+        Raises:
+            ValueError: If a pyxpic id is not a UUID.
+        """
+
+        metadata = {}
+        cursor = None
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+            while True:
+                (page, cursor) = self.fetch_pyxpic_page(user_id, page_size=page_size, cursor=cursor)
+                for (pyxpic_id, pyxpic) in page.items():
+                    # The id becomes an entry name, so it must not be able to point outside the extraction directory.
+                    Storage.validate_id(pyxpic_id)
+
+                    # The frames are already compressed, they are stored as is.
+                    raw_image = pyxpic.get("raw_image")
+                    if isinstance(raw_image, (bytes, bytearray)):
+                        archive.writestr(f"{pyxpic_id}.bin", raw_image, zipfile.ZIP_STORED)
+                    else:
+                        archive.writestr(f"{pyxpic_id}.json", json.dumps(raw_image))
+
+                    date = pyxpic.get("date")
+                    metadata[pyxpic_id] = {
+                        "owner_id": pyxpic.get("owner_id"),
+                        "order_number": pyxpic.get("order_number"),
+                        "date": date.isoformat() if isinstance(date, datetime) else date
+                    }
+
+                if progress is not None:
+                    progress(len(metadata))
+                if cursor is None:
+                    break
+
+            archive.writestr("pyxpics.json", json.dumps(metadata, indent=4))
+
+        return len(metadata)
+
+    def _run_batches(self, batches, write, workers: int, progress) -> int:
+        """Write batches on a pool of threads, with a bounded number of batches in flight.
+
+        Args:
+            batches (iterable): The batches, lists produced lazily.
+            write (function): Writes a batch.
+            workers (int): The maximum number of batches written at the same time.
+            progress (function): Called with the number of items written so far after each batch, or None.
+
+        Returns:
+            int: The number of items written.
+        """
+
+        done = 0
+        pending = set()
+
+        def write_batch(batch: list) -> int:
+            write(batch)
+            return len(batch)
+
+        def collect(futures) -> None:
+            nonlocal done
+            for future in futures:
+                done += future.result()
+                if progress is not None:
+                    progress(done)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for batch in batches:
+                # Wait for a batch to be written before producing a new one.
+                if len(pending) >= workers:
+                    (finished, pending) = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(finished)
+                pending.add(executor.submit(write_batch, batch))
+            collect(wait(pending).done)
+
+        return done
 
     def is_uuid_already_used(self, pyxpic_id: str) -> bool:
         """Check if a pyxpic id is already used.
@@ -172,6 +574,48 @@ class Database(object):
         # Check if the pyxpic id is already used by comparing it to None.
         return self.get_pyxpic(pyxpic_id) is not None
 
+    def _get_entry(self, pyxpic_id: str) -> dict:
+        """Get the cache entry of a pyxpic, reading the pyxpic from the database on a miss.
+
+        Args:
+            pyxpic_id (str): The id of the pyxpic.
+
+        Returns:
+            dict: The pyxpic data ("data") and its decoded frame ("frame", None until it is decoded). None if the pyxpic does not exist.
+        """
+        entry = self.cache.get(pyxpic_id)
+        if entry is None:
+            data = self.backend.get(pyxpic_id)
+            if data is None:
+                return None
+            entry = {"data": data, "frame": None}
+            self.cache.put(pyxpic_id, entry)
+        return entry
+
+    def _invalidate(self, pyxpic_id: str, data: dict = None) -> None:
+        """Remove a pyxpic and the pyxpics of its owners from the cache.
+
+        Args:
+            pyxpic_id (str): The id of the pyxpic.
+            data (dict, optional): The new data of the pyxpic. Defaults to None.
+        """
+        if self.cache is None:
+            return
+
+        # The pyxpics of the old and the new owner are outdated.
+        entry = self.cache.pop(pyxpic_id)
+        owner_ids = set()
+        if entry is not None:
+            owner_ids.add(entry["data"].get("owner_id"))
+        if data is not None and "owner_id" in data:
+            owner_ids.add(data["owner_id"])
+        for owner_id in owner_ids:
+            self.cache.pop(("user", owner_id))
+
+    def _on_change(self, pyxpic_id: str, data: dict) -> None:
+        # Called by the listener of the backend when a pyxpic is added, modified or removed.
+        self._invalidate(pyxpic_id, data)
+
 
 class DatabaseUtils(object):
 
@@ -186,9 +630,193 @@ class DatabaseUtils(object):
         # Create a random pyxpic id using uuid python module.
         return str(uuid.uuid4())
 
+    @staticmethod
+    def create_random_pyxpic_ids(count: int) -> list:
+        """Create random pyxpic ids in bulk, on the client side (no round-trip to the database).
+
+        Args:
+            count (int): The number of ids.
+
+        Returns:
+            list: The pyxpic ids.
+        """
+
+        # Create the random pyxpic ids using uuid python module.
+        return [str(uuid.uuid4()) for i in range(count)]
+
+    # <----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------- #
+    # Compact frame format used to store the raw images.
+    # Header: magic "PXF", version, flags, ramp id, width and height (big-endian).
+    # Body (zlib-compressed if the flag is set): the ramp index of every character packed on 4 bits (two per byte, high nibble first),
+    # followed, if the flag is set, by the color of every character quantized on 8 bits (RGB 3-3-2).
+
+    FRAME_MAGIC = b"PXF"
+    FRAME_VERSION = 1
+    FRAME_HEADER = struct.Struct(">3sBBBHH")
+    FRAME_ZLIB = 0x01
+    FRAME_COLORS = 0x02
+
+    # Characters of the ASCII frames (the distinct characters of CameraUtils.ASCII_CHARS), by ramp index.
+    FRAME_RAMP = "".join(dict.fromkeys(CameraUtils.ASCII_CHARS))
+
+    # Low byte of the CRC-32 of the ramp, stored in the header so a frame encoded with another ramp is rejected instead of decoded wrong.
+    FRAME_RAMP_ID = zlib.crc32(FRAME_RAMP.encode("ascii")) & 0xff
+
+    @staticmethod
+    def encode_raw_image(ascii_frame: str, normal_frame: np.ndarray = None, compress: bool = True) -> bytes:
+        """Encode an ASCII frame in the compact frame format.
+
+        Args:
+            ascii_frame (str): The ASCII frame (without colors).
+            normal_frame (np.ndarray, optional): The BGR frame giving the color of each character. Defaults to None (no color plane).
+            compress (bool, optional): Compress the body with zlib. Defaults to True.
+
+        Returns:
+            bytes: The encoded frame.
+        """
+
+        # Get the ramp index of every character, padding the short lines with spaces.
+        lines = ascii_frame.split("\n")
+        if lines and lines[-1] == "":
+            lines.pop()
+        width = max((len(line) for line in lines), default=0)
+        height = len(lines)
+        ramp_index = np.full(256, 0xff, dtype=np.uint8)
+        for (index, char) in enumerate(DatabaseUtils.FRAME_RAMP):
+            ramp_index[ord(char)] = index
+        codes = np.full((height, width), ord(" "), dtype=np.uint8)
+        for (row, line) in enumerate(lines):
+            codes[row, :len(line)] = np.frombuffer(line.encode("ascii", "replace"), dtype=np.uint8)
+        indices = ramp_index[codes].ravel()
+        if (indices == 0xff).any():
+            raise ValueError("The ASCII frame contains characters that are not in the ramp")
+
+        # Pack two indices per byte.
+        if len(indices) % 2:
+            indices = np.append(indices, 0)
+        body = ((indices[0::2] << 4) | indices[1::2]).astype(np.uint8).tobytes()
+
+        # Add the colors, quantized on 8 bits.
+        flags = 0
+        if normal_frame is not None:
+            frame = np.zeros((height, width, 3), dtype=np.uint8)
+            colors = np.asarray(normal_frame, dtype=np.uint8)[:height, :width]
+            frame[:colors.shape[0], :colors.shape[1]] = colors
+            body += ((frame[:, :, 2] & 0xe0) | ((frame[:, :, 1] & 0xe0) >> 3) | (frame[:, :, 0] >> 6)).tobytes()
+            flags |= DatabaseUtils.FRAME_COLORS
+
+        # Compress the body.
+        if compress:
+            body = zlib.compress(body)
+            flags |= DatabaseUtils.FRAME_ZLIB
+
+        # Return the encoded frame.
+        header = DatabaseUtils.FRAME_HEADER.pack(
+            DatabaseUtils.FRAME_MAGIC, DatabaseUtils.FRAME_VERSION, flags, DatabaseUtils.FRAME_RAMP_ID, width, height)
+        return header + body
+
+    @staticmethod
+    def decode_raw_image_matrix(raw_image) -> np.ndarray:
+        """Decode a raw image into a matrix of characters. Also reads the legacy raw images (str or dict of lines).
+
+        Args:
+            raw_image (bytes | str | dict): The raw image.
+
+        Returns:
+            np.ndarray: The characters, one per cell.
+        """
+
+        # Legacy raw images.
+        if isinstance(raw_image, dict):
+            lines = [raw_image[key] for key in sorted(raw_image, key=int)]
+            raw_image = "\n".join("".join(line) for line in lines)
+        if isinstance(raw_image, str):
+            lines = [line for line in raw_image.split("\n") if line]
+            width = max((len(line) for line in lines), default=0)
+            return np.array([list(line.ljust(width)) for line in lines], dtype="<U1").reshape(len(lines), width)
+
+        # Compact frame format.
+        (indices, colors) = DatabaseUtils._unpack_raw_image(raw_image)
+        return np.array(list(DatabaseUtils.FRAME_RAMP), dtype="<U1")[indices]
+
+    @staticmethod
+    def decode_raw_image(raw_image) -> str:
+        """Decode a raw image into an ASCII frame. Also reads the legacy raw images (str or dict of lines).
+
+        Args:
+            raw_image (bytes | str | dict): The raw image.
+
+        Returns:
+            str: The ASCII frame.
+        """
+        matrix = DatabaseUtils.decode_raw_image_matrix(raw_image)
+        return "".join("".join(row) + "\n" for row in matrix.tolist()) if matrix.shape[1] else ""
+
+    @staticmethod
+    def decode_raw_image_colors(raw_image) -> np.ndarray:
+        """Decode the color plane of a raw image.
+
+        Args:
+            raw_image (bytes | str | dict): The raw image.
+
+        Returns:
+            np.ndarray: The BGR color of every character, None if the raw image has no color plane.
+        """
+        if not isinstance(raw_image, (bytes, bytearray)):
+            return None
+        return DatabaseUtils._unpack_raw_image(raw_image)[1]
+
+    @staticmethod
+    def _unpack_raw_image(raw_image: bytes) -> tuple:
+        """Unpack a raw image in the compact frame format.
+
+        Args:
+            raw_image (bytes): The encoded frame.
+
+        Returns:
+            np.ndarray: The ramp index of every character.
+            np.ndarray: The BGR color of every character, None if there is no color plane.
+
+        Raises:
+            ValueError: If the raw image is not in a supported frame format or was encoded with another ramp.
+        """
+
+        # Read the header.
+        (magic, version) = (bytes(raw_image[:3]), raw_image[3] if len(raw_image) > 3 else None)
+        if magic != DatabaseUtils.FRAME_MAGIC or version != DatabaseUtils.FRAME_VERSION:
+            raise ValueError("The raw image is not in a supported frame format")
+        header_size = DatabaseUtils.FRAME_HEADER.size
+        (_, _, flags, ramp_id, width, height) = DatabaseUtils.FRAME_HEADER.unpack(bytes(raw_image[:header_size]))
+        if ramp_id != DatabaseUtils.FRAME_RAMP_ID:
+            raise ValueError("The raw image was encoded with another character ramp")
+
+        # Read the body.
+        body = bytes(raw_image[header_size:])
+        if flags & DatabaseUtils.FRAME_ZLIB:
+            body = zlib.decompress(body)
+
+        # Unpack the indices, two per byte.
+        cells = width * height
+        packed = np.frombuffer(body, dtype=np.uint8, count=(cells + 1) // 2)
+        indices = np.empty(len(packed) * 2, dtype=np.uint8)
+        indices[0::2] = packed >> 4
+        indices[1::2] = packed & 0x0f
+        indices = indices[:cells].reshape(height, width)
+
+        # Expand the colors back to 8 bits per channel.
+        colors = None
+        if flags & DatabaseUtils.FRAME_COLORS:
+            quantized = np.frombuffer(body, dtype=np.uint8, count=cells, offset=len(packed)).reshape(height, width)
+            colors = np.empty((height, width, 3), dtype=np.uint8)
+            colors[:, :, 2] = (quantized & 0xe0) | 0x10
+            colors[:, :, 1] = ((quantized & 0x1c) << 3) | 0x10
+            colors[:, :, 0] = ((quantized & 0x03) << 6) | 0x20
+
+        return (indices, colors)
+
 
 if __name__ == "__main__":
+    # Delete every pyxpic, in batches.
     db = Database()
-    all_pyxpic = db.fetch_all_pyxpic()
-    for pyxpic_id, pyxpic_data in all_pyxpic.items():
-        db.delete_pyxpic(pyxpic_id)
+    deleted = db.delete_pyxpics(progress=lambda count: print(f"{count} pyxpic deleted"))
+    print(f"Done, {deleted} pyxpic deleted")
@@ -0,0 +1,202 @@
+# PyxMap
+# Copyright © 2023 Cléry Arque-Ferradou, Nathanaël Lejuste, De Beaumont du Repaire Carla, Chasseigne Ulysse
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import cv2
+import numpy as np
+import sys
+import time
+from camera import CameraUtils, CaptureSession
+
+
+class LiveView(object):
+    def __init__(self, session: CaptureSession = None, fps: float = 15, color: bool = True, palette: str = "truecolor", stream=None) -> None:
+        """Initialize the live view, streaming the camera as ASCII art in the terminal.
+
+        Args:
+            session (CaptureSession, optional): The capture session to read the frames from. Defaults to a threaded session on the first camera.
+            fps (float, optional): Target number of frames per second. Defaults to 15.
+            color (bool, optional): If the ASCII frames should be colored. Defaults to True.
+            palette (str, optional): The colors used by the terminal: "truecolor", "256" or "16". Defaults to "truecolor".
+            stream (optional): The stream to write to. Defaults to sys.stdout.
+        """
+
+        # Initialize class variables.
+        self.own_session = session is None
+        self.session = session if session is not None else CaptureSession(threaded=True)
+        self.fps = fps
+        self.color = color
+        self.palette = palette
+        self.stream = stream if stream is not None else sys.stdout
+        self.running = False
+
+        # Frame drawn on the screen, used to redraw only what changed.
+        self.previous_chars = None
+        self.previous_codes = None
+
+        # Statistics shown in the status line.
+        self.measured_fps = 0.0
+        self.latency = 0.0
+
+    def run(self) -> None:
+        """Stream the camera until the user presses Ctrl+C.
+        """
+
+        # Switch to the alternate screen and hide the cursor.
+        self.stream.write("\033[?1049h\033[?25l\033[2J")
+        self.running = True
+        self.previous_chars = None
+        last_frame_time = None
+
+        try:
+            while self.running:
+                frame_start = time.monotonic()
+
+                # Read the freshest frame.
+                (ret, frame) = self.session.read()
+                if not ret:
+                    time.sleep(CaptureSession.READ_RETRY_DELAY)
+                    continue
+                captured = time.monotonic()
+
+                # Draw the frame, leaving the last line for the status.
+                (rows, columns) = CameraUtils.get_window_size()
+                output = self.render(frame, rows - 1, columns)
+                output += self._status_line(rows)
+                self.stream.write(output)
+                self.stream.flush()
+
+                # Update the statistics.
+                now = time.monotonic()
+                self.latency = now - captured
+                if last_frame_time is not None:
+                    self.measured_fps = 0.9 * self.measured_fps + 0.1 / max(now - last_frame_time, 1e-6)
+                last_frame_time = now
+
+                # Pace the frames to the target FPS.
+                time.sleep(max(0.0, 1 / self.fps - (time.monotonic() - frame_start)))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # Restore the terminal.
+            self.running = False
+            self.stream.write("\033[0m\033[?25h\033[?1049l")
+            self.stream.flush()
+
+            # Release the camera if it was opened for the live view only.
+            if self.own_session:
+                self.session.release()
+
+    def stop(self) -> None:
+        """Stop the stream after the current frame.
+        """
+        self.running = False
+
+    def render(self, frame: np.ndarray, rows: int, columns: int) -> str:
+        """Convert a camera frame to ASCII art fitting the terminal and return the escape sequences redrawing it.
+
+        Args:
+            frame (np.ndarray): The BGR camera frame.
+            rows (int): Number of rows available.
+            columns (int): Number of columns available.
+
+        Returns:
+            str: The escape sequences to write to the terminal.
+        """
+
+        # Fit the frame in the terminal, keeping its aspect ratio. (A character is about 1.8 times taller than wide)
+        (height, width) = frame.shape[:2]
+        cells_width = max(1, min(columns, int(rows * 1.8 * width / height)))
+        cells_height = max(1, min(rows, int(cells_width * height / width / 1.8)))
+        frame = cv2.resize(frame, (cells_width, cells_height), interpolation=cv2.INTER_AREA)
+        cv2.flip(frame, 1, dst=frame)
+
+        # Convert the frame to characters and color codes.
+        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        chars = CameraUtils.get_ascii_lut()[gray_frame]
+        codes = CameraUtils.get_color_codes(frame, self.palette) if self.color else None
+
+        # Return the differences with the frame on the screen.
+        return self.render_diff(chars, codes)
+
+    def render_diff(self, chars: np.ndarray, codes: np.ndarray = None) -> str:
+        """Get the escape sequences rewriting only the characters that changed since the previous frame.
+
+        Args:
+            chars (np.ndarray): The ASCII characters of the new frame.
+            codes (np.ndarray, optional): The color codes of the new frame. Defaults to None (no color).
+
+        Returns:
+            str: The escape sequences to write to the terminal.
+        """
+
+        output = ""
+
+        # Redraw everything the first time or when the size of the frame changed.
+        if self.previous_chars is None or self.previous_chars.shape != chars.shape:
+            changed = np.ones(chars.shape, dtype=bool)
+            output += "\033[0m\033[2J"
+        else:
+            changed = chars != self.previous_chars
+            if codes is not None and self.previous_codes is not None:
+                changed |= codes != self.previous_codes
+
+        # Remember the frame drawn on the screen.
+        self.previous_chars = chars
+        self.previous_codes = codes
+
+        rows, columns = np.nonzero(changed)
+        if len(rows) == 0:
+            return output
+
+        # A run of changed characters starts where the previous changed character is not just before on the same line.
+        starts = np.ones(len(rows), dtype=bool)
+        starts[1:] = (rows[1:] != rows[:-1]) | (columns[1:] != columns[:-1] + 1)
+
+        # Get the changed characters.
+        cells = chars[rows, columns]
+
+        # Prefix the characters whose color differs from the previous one written with their escape sequence.
+        if codes is not None:
+            selected_codes = codes[rows, columns]
+            escaped = starts.copy()
+            escaped[1:] |= selected_codes[1:] != selected_codes[:-1]
+            cells[escaped] = CameraUtils.get_color_escapes(
+                selected_codes[escaped], self.palette) + cells[escaped]
+
+        # Move the cursor at the start of every run.
+        numbers = np.array([str(i) for i in range(max(chars.shape) + 2)], dtype=object)
+        cells[starts] = "\033[" + numbers[rows[starts] + 1] + ";" + \
+            numbers[columns[starts] + 1] + "H" + cells[starts]
+
+        # Return the escape sequences.
+        return output + "".join(cells.tolist())
+
+    def _status_line(self, row: int) -> str:
+        """Get the escape sequences drawing the FPS and latency counters on a line.
+
+        Args:
+            row (int): The line to draw on (starting at 1).
+
+        Returns:
+            str: The escape sequences to write to the terminal.
+        """
+        return f"\033[{row};1H\033[0m\033[2KFPS: {self.measured_fps:5.1f} | Latency: {self.latency * 1000:6.1f} ms"
+
+
+if __name__ == "__main__":
+    live = LiveView()
+    live.run()
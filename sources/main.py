@@ -15,10 +15,16 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import argparse
 import json
-from camera import Camera, CameraUtils
+from camera import Camera, CameraUtils, CaptureSession
+from convert import Converter
 from database import Database, DatabaseUtils
+from storage import FirestoreClientProvider, FirestoreStorage, QueuedStorage, SQLiteStorage
 from qrcode import QRCode
+from live import LiveView
+from worker import WorkQueue
+import threading
 import time
 import platform
 import os
@@ -58,6 +64,44 @@ class App(object):
     def run(self) -> None:
         """This function runs the app.
         """
+        # Open the camera once, it is shared by the QR Code scanner and the ASCII camera.
+        # The frames are grabbed in the background so both always get the freshest one.
+        session = CaptureSession(CameraUtils.list_cameras()[0], threaded=True)
+        session.open()
+
+        # Store the pyxpics locally on the offline kiosks, in Firestore otherwise.
+        # With the "queued" storage, they are recorded locally right away and synced to Firestore in the background.
+        if self.config.get('storage') == 'sqlite':
+            self.storage = SQLiteStorage()
+        elif self.config.get('storage') == 'queued':
+            self.storage = QueuedStorage(FirestoreStorage()).start()
+        else:
+            self.storage = FirestoreStorage()
+
+        # The Firestore client is shared by the whole app. Connect it in the background, so the first upload does not set up
+        # the channel and an offline kiosk does not wait for the health check to start.
+        if self.config.get('storage') != 'sqlite':
+            threading.Thread(target=FirestoreClientProvider.check, name="FirestoreCheck", daemon=True).start()
+        self.database = Database(self.storage)
+
+        # Save and upload the pyxpics in the background, so the loop only captures and converts.
+        self.work_queue = WorkQueue(workers=2, max_size=8)
+
+        try:
+            self._loop(session)
+        finally:
+            # Finish the pending saves and uploads, then release the camera.
+            self.work_queue.shutdown()
+            if isinstance(self.storage, QueuedStorage):
+                self.storage.stop()
+            session.release()
+
+    def _loop(self, session: CaptureSession) -> None:
+        """This function runs the app loop.
+
+        Args:
+            session (CaptureSession): The capture session shared by the components.
+        """
         while self.running:
 
             if self.speak:
@@ -67,46 +111,91 @@ class App(object):
             # Instancing the QRCode class
             qr = QRCode()
             # Reading the QR Code
-            owner_id = qr.read(camera=CameraUtils.list_cameras()[0])
+            owner_id = qr.read(session=session)
 
             if self.speak:
                 os.system(
                     """say "Merci, c'est parfait ! Maintenant, tu peux sourire !" """)
 
-            time.sleep(1)
             # Instancing the Camera class
-            cam = Camera(scale=5)
+            cam = Camera(scale=5, session=session)
             # Capturing the frame
             capture = cam.capture()
-            time.sleep(1)
-            # Getting the normal frame
-            normal_frame = cam.get_normal_frame(capture)
-            # Getting the gray frame
-            gray_frame = cam.get_gray_frame(capture)
+            # Getting the normal and gray frames from the same capture
+            normal_frame, gray_frame = cam.get_frames(capture)
+            # Starting over if the camera did not give a frame
+            if normal_frame is None:
+                continue
             # Getting the ASCII frame
             ascii_frame = cam.get_ascii_frame(
                 normal_frame, gray_frame, color=False)
-            # Saving the ASCII frame
-            cam.save_ascii_image(ascii_frame, f'{owner_id}.png')
-
-            if self.speak:
-                os.system(
-                    f"""say "C'est bon, j'ai enregistré ta photo sous le nom de {owner_id}.png ! Maintenant, je vais l'envoyer à la base de données !" """)
-
-            # Adding the ASCII frame to the database
-            db = Database()
-            # Adding the ASCII frame to the database
-            db.add_pyxpic(DatabaseUtils.create_random_pyxpic_id(
-            ), owner_id, ascii_frame)
+            # Saving the ASCII frame in the background
+            self.work_queue.submit(
+                cam.save_ascii_image, ascii_frame, f'{owner_id}.png')
+            # Adding the ASCII frame to the database in the background (the id is created once, so the retries reuse it)
+            self.work_queue.submit(self._upload_pyxpic, DatabaseUtils.create_random_pyxpic_id(), owner_id, ascii_frame)
 
             if self.speak:
                 os.system(
-                    """say "C'est bon, j'ai envoyé ta photo à la base de données !" """)
+                    f"""say "C'est bon, j'enregistre ta photo sous le nom de {owner_id}.png et je l'envoie à la base de données !" """)
                 os.system(
                     """say "Passe une bonne journée ! Et n'oublie pas de me montrer ta carte de cantine demain !" """)
-            time.sleep(10)
+            time.sleep(self.config.get('cooldown', 10))
+
+    def _upload_pyxpic(self, pyxpic_id: str, owner_id: str, ascii_frame: str) -> None:
+        """This function adds an ASCII frame to the database. It runs in the work queue, which retries it on failure.
+
+        Args:
+            pyxpic_id (str): The id of the pyxpic.
+            owner_id (str): The id of the owner.
+            ascii_frame (str): The ASCII frame.
+        """
+        # Adding the ASCII frame to the database (the database and its client are reused for every capture)
+        # A retry finding the pyxpic already added by the failed attempt keeps it instead of adding a copy.
+        self.database.add_pyxpic(pyxpic_id, owner_id, ascii_frame, exist_ok=True)
 
 
 if __name__ == "__main__":
-    app = App()
-    app.run()
+    # Parse the command line. (Running the kiosk app if no command is given)
+    parser = argparse.ArgumentParser(prog="pyxmap", description="PyxMap is a N.S.I. project!")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("run", help="run the kiosk app (default)")
+    live_parser = commands.add_parser("live", help="stream the camera as ASCII art in the terminal")
+    live_parser.add_argument("--camera", type=int, default=-1, help="camera index (default: first camera available)")
+    live_parser.add_argument("--fps", type=float, default=15, help="target frames per second (default: 15)")
+    live_parser.add_argument("--palette", choices=CameraUtils.PALETTES, default="truecolor", help="terminal colors (default: truecolor)")
+    live_parser.add_argument("--no-color", action="store_true", help="draw the frames without colors")
+    convert_parser = commands.add_parser("convert", help="convert images and videos to ASCII art")
+    convert_parser.add_argument("inputs", nargs="+", metavar="PATH", help="image files, directories of images or video files")
+    convert_parser.add_argument("--output", default="./saves/convert", help="output directory (default: ./saves/convert)")
+    convert_parser.add_argument("--format", choices=("text", "png", "both"), default="text", help="output format (default: text)")
+    convert_parser.add_argument("--scale", type=float, default=5, help="scale factor of the frames (default: 5)")
+    convert_parser.add_argument("--color", action="store_true", help="color the ASCII art")
+    convert_parser.add_argument("--palette", choices=CameraUtils.PALETTES, default="truecolor", help="colors of the text (default: truecolor)")
+    convert_parser.add_argument("--workers", type=int, default=None, help="number of processes (default: one per core)")
+    convert_parser.add_argument("--chunk-size", type=int, default=8, help="frames sent to a process at once (default: 8)")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        # Convert the images and videos across a pool of processes.
+        converter = Converter(
+            args.output, args.scale, text=args.format in ("text", "both"), image=args.format in ("png", "both"),
+            color=args.color, palette=args.palette, workers=args.workers, chunk_size=args.chunk_size,
+            progress=lambda count: print(f"\r{count} frames converted", end="", flush=True))
+        try:
+            converter.convert(args.inputs)
+        except ValueError as error:
+            # End the progress line before the error.
+            print()
+            parser.error(str(error))
+        print()
+    elif args.command == "live":
+        # Stream the camera in the terminal.
+        session = CaptureSession(args.camera, threaded=True)
+        try:
+            LiveView(session, fps=args.fps, color=not args.no_color, palette=args.palette).run()
+        finally:
+            session.release()
+    else:
+        app = App()
+        app.run()
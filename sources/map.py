@@ -27,7 +27,7 @@
 import pygame
 import numpy as np
 import threading
-from database import Database
+from database import Database, DatabaseUtils
 
 
 class Map(object):
@@ -39,48 +39,33 @@ class Map(object):
             self.load_map()
 
     def load_map(self) -> None:
-        # Load the map from the database
+        # Load the map from the database, page by page with the raw images (one read per page)
         # <-- Return a dictionary.
-        self.all_pyxpics = Database().fetch_all_pyxpic()
+        self.all_pyxpics = dict(Database().iter_pyxpic())
 
     def display_map(self) -> None:
         matrices = (self.map_to_matrices(self.all_pyxpics))
         self.matrix_viewer(matrices)
 
     def get_raw_image(self, pyxpic: dict) -> str:
-        result_matrix = []
-        for key, value in pyxpic.items():
-            if key == 'raw_image':
-                for line_int, line_content in value.items():
-                    temp_line = []
-                    for e in line_content:
-                        print(e, end="")
-                        temp_line.append(e)
-                    print("")
-                    # print(temp_line)
-                    result_matrix.append(temp_line)
-                    # print(result_matrix)
-
-                    # Remove empty lists from the map (bug fix from camera.py)
-                    for e in result_matrix:
-                        if len(e) == 0:
-                            result_matrix.remove(e)
-
-                result_matrix = np.array(
-                    result_matrix)
-
-        return result_matrix
+        # Decode the raw image (compact frame format or legacy dict of lines) into a matrix of characters
+        return DatabaseUtils.decode_raw_image_matrix(pyxpic['raw_image'])
 
     def map_to_matrices(self, map_data):
         matrices = []
         for pyxpic_id, pyxpic_data in map_data.items():
             print(pyxpic_id)
-            matrix = self.get_raw_image(pyxpic_data)
-            matrices.append(matrix)
+            # Skip the pyxpics without a raw image (deleted while the map was loading)
+            if pyxpic_data.get('raw_image') is None:
+                continue
+            matrices.append(self.get_raw_image(pyxpic_data))
 
         return matrices
 
     def draw_matrix(self, screen, font, matrices, zoom, offset_x, offset_y):
+        if not matrices:
+            return
+
         cell_size = 0.5 * zoom
         num_matrices = len(matrices)
         square_size = int(np.ceil(np.sqrt(num_matrices)))
@@ -15,67 +15,422 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import argparse
 import cv2
+import numpy as np
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pyzbar import pyzbar
-from camera import CameraUtils
+from camera import CameraUtils, CaptureSession
 
 
 class QRCode(object):
     def __init__(self) -> None:
         pass
 
-    def read(self, file: str = None, camera: int = 0, showCameraWindow: bool = False) -> None:
+    def read(self, file: str = None, camera: int = 0, showCameraWindow: bool = False, session: CaptureSession = None, timeout: float = None) -> None:
         """This function allows to read QR Codes.
 
         Args:
-            file (str, optional): Pass the path to the image that you want to scan. If not set, using camera. Defaults to None.
+            file (str, optional): Pass the path to the image (or to a directory of images) that you want to scan. If not set, using camera. Defaults to None.
             camera (int, optional): Pass the camera number that CV2 module will use to scan a QR Code. Defaults to 0.
+            session (CaptureSession, optional): An opened capture session to read the frames from. If not set, a session is opened on the camera for this call. Defaults to None.
+            timeout (float, optional): Stop scanning after this time in seconds. Defaults to None (scan until a QR Code is read).
+
+        Returns:
+            str: The decoded QR Code information, None if the timeout expired.
         """
 
+        # Scan the image files instead of the camera.
+        if file is not None:
+            for (path, barcodes) in QRCodeUtils.decode_files(CameraUtils.list_images(file, recursive=True), workers=1):
+                if barcodes:
+                    return barcodes[0][0]
+            return None
+
         # Initialize the barcode information.
         barcode_info = None
+        deadline = time.monotonic() + timeout if timeout is not None else None
 
-        while barcode_info == None:
+        # Open the camera once for the whole scan if no session is shared.
+        own_session = session is None
+        if own_session:
+            session = CaptureSession(camera)
 
-            # Read the camera or the image.
-            cap = cv2.VideoCapture(camera)
-            ret, frame = cap.read()
+        # Show the frames in a preview window only if the user wants to. (Otherwise no GUI call is made, so it runs headless)
+        preview = QRCodePreview() if showCameraWindow else None
 
-            # Decode the QR Code.
-            barcodes = pyzbar.decode(frame)
+        # Decode in the background, one frame at a time: the frames read while a decode is in flight are skipped.
+        executor = ThreadPoolExecutor(max_workers=1)
+        decoding = None
 
-            # Loop over all detected barcodes.
-            for barcode in barcodes:
-                x, y, w, h = barcode.rect
+        try:
+            while barcode_info == None:
 
-                # The barcode data is a bytes object so we convert it to a string.
-                barcode_info = barcode.data.decode('utf-8')
+                # Stop when the timeout expired, or when the user pressed "q" in the preview.
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+                if preview is not None and preview.quit:
+                    break
 
-                # Draw the barcode area in the image.
-                cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
+                # Read the camera or the image. (Waiting a bit before trying again if no frame was read)
+                ret, frame = session.read()
+                if not ret:
+                    time.sleep(CaptureSession.READ_RETRY_DELAY)
+                    continue
 
-                # Draw the barcode data and barcode type on the image.
-                font = cv2.FONT_HERSHEY_SIMPLEX
-                cv2.putText(frame, barcode_info, (x + 6, y - 15),
-                            font, 2.0, (255, 255, 255), 1)
+                # Start decoding the frame, unless the previous one is still being decoded.
+                if decoding is None or decoding.done():
+                    barcodes = decoding.result() if decoding is not None else []
+                    decoding = executor.submit(QRCodeUtils.decode, frame)
+                else:
+                    barcodes = []
 
-            # If the user presses "q", quit.
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+                # The barcode data of the first barcode.
+                if barcodes:
+                    barcode_info = barcodes[0][0]
 
-            # Show the camera window if the user wants to.
-            if showCameraWindow:
-                cv2.imshow('Camera', frame)
+                # Show the frame in the preview, from this thread. (The decoding runs in the background)
+                if preview is not None:
+                    preview.show(frame, barcodes)
+        finally:
+            # Close the preview.
+            if preview is not None:
+                preview.stop()
 
-            # Release the camera and close all windows.
-            cap.release()
-            cv2.destroyAllWindows()
+            # Release the camera if it was opened for this call only.
+            executor.shutdown(wait=False)
+            if own_session:
+                session.release()
 
         # Return the barcode information.
         return barcode_info
 
 
+class QRCodePreview(object):
+    def __init__(self, title: str = "Camera") -> None:
+        """Initialize a preview window showing the frames and the QR Codes read. The window is opened by the first frame shown.
+        The GUI calls (drawing, showing, waiting for a key) are made by show(), from the thread of the scan loop:
+        some platforms, like macOS, only allow GUI calls from the main thread. Only the decoding runs in the background.
+
+        Args:
+            title (str, optional): The title of the window. Defaults to "Camera".
+        """
+
+        # Initialize class variables.
+        self.title = title
+        self.barcodes = []
+        self.quit = False
+        self.opened = False
+
+    def stop(self) -> None:
+        """Close the window.
+        """
+        if self.opened:
+            cv2.destroyWindow(self.title)
+            cv2.waitKey(1)
+            self.opened = False
+
+    def show(self, frame: np.ndarray, barcodes: list = None) -> None:
+        """Show a frame, with the QR Codes read drawn on it, and check if the user pressed "q" (see quit).
+
+        Args:
+            frame (np.ndarray): The frame. It is not modified.
+            barcodes (list, optional): The QR Codes read, (data, (x, y, w, h)) tuples. Defaults to None (keep the previous ones).
+        """
+        if barcodes:
+            self.barcodes = barcodes
+
+        # Draw the barcode areas and data on a copy of the image.
+        frame = frame.copy()
+        for (barcode_info, (x, y, w, h)) in self.barcodes:
+            cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
+            cv2.putText(frame, barcode_info, (x + 6, y - 15),
+                        cv2.FONT_HERSHEY_SIMPLEX, 2.0, (255, 255, 255), 1)
+        cv2.imshow(self.title, frame)
+        self.opened = True
+
+        # If the user presses "q", quit.
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            self.quit = True
+
+
+# A QR Code read by the QRCodeScanner: its data, its bounding box (x, y, w, h) and the time it was read at.
+ScanEvent = namedtuple("ScanEvent", ["data", "rect", "timestamp"])
+
+
+class QRCodeScanner(object):
+    def __init__(self, session: CaptureSession = None, camera: int = 0, window: float = 5.0, track_ttl: float = 1.0, padding: float = 0.5, full_scan_interval: int = 10) -> None:
+        """Initialize a scanner reading every QR Code in view, so one camera can serve a queue of people.
+        The QR Codes read recently are tracked, so the next frames only decode the regions around them (and the whole frame from time to time, to find the new ones).
+
+        Args:
+            session (CaptureSession, optional): An opened capture session to read the frames from. If not set, a session is opened on the camera while scanning. Defaults to None.
+            camera (int, optional): The camera number, used if no session is given. Defaults to 0.
+            window (float, optional): A QR Code read again within this time in seconds is not reported again. Defaults to 5.0.
+            track_ttl (float, optional): Stop tracking a QR Code not read for this time in seconds. Defaults to 1.0.
+            padding (float, optional): The padding added around a tracked QR Code, relative to its size. Defaults to 0.5.
+            full_scan_interval (int, optional): Decode the whole frame at least every this number of frames. Defaults to 10.
+        """
+
+        # Initialize class variables.
+        self.session = session
+        self.camera = camera
+        self.window = window
+        self.track_ttl = track_ttl
+        self.padding = padding
+        self.full_scan_interval = full_scan_interval
+
+        # The location and read time of the tracked QR Codes, and the last read time of every QR Code.
+        self.tracks = {}
+        self.last_read = {}
+        self.frames = 0
+
+        # Statistics.
+        self.full_scans = 0
+        self.roi_scans = 0
+
+    def scan(self, timeout: float = None):
+        """Scan the camera and yield every new QR Code read.
+
+        Args:
+            timeout (float, optional): Stop scanning after this time in seconds. Defaults to None (scan forever).
+
+        Yields:
+            ScanEvent: The QR Code read.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        # Open the camera for the scan if no session is shared.
+        own_session = self.session is None
+        session = CaptureSession(self.camera) if own_session else self.session
+        try:
+            while deadline is None or time.monotonic() < deadline:
+                ret, frame = session.read()
+                if not ret:
+                    time.sleep(CaptureSession.READ_RETRY_DELAY)
+                    continue
+                yield from self.scan_frame(frame)
+        finally:
+            if own_session:
+                session.release()
+
+    def scan_frame(self, frame: np.ndarray, timestamp: float = None) -> list:
+        """Decode the QR Codes of a frame and update the tracking.
+
+        Args:
+            frame (np.ndarray): The frame (BGR or grayscale).
+            timestamp (float, optional): The time the frame was read at (time.time()). Defaults to now.
+
+        Returns:
+            list: The ScanEvent of the QR Codes not read within the window.
+        """
+        timestamp = timestamp if timestamp is not None else time.time()
+        self.frames += 1
+
+        # Forget the QR Codes not read for a while.
+        self.tracks = {data: track for (data, track) in self.tracks.items() if timestamp - track[1] <= self.track_ttl}
+
+        # Only decode around the tracked QR Codes, unless it is time to look for new ones.
+        barcodes = []
+        if self.tracks and self.frames % self.full_scan_interval != 0:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+            barcodes = QRCodeUtils.decode_regions(gray, [rect for (rect, seen) in self.tracks.values()], self.padding)
+            self.roi_scans += 1
+        if not barcodes:
+            barcodes = QRCodeUtils.decode(frame)
+            self.full_scans += 1
+
+        # Report the QR Codes not read within the window.
+        events = []
+        for (data, rect) in barcodes:
+            if timestamp - self.last_read.get(data, float("-inf")) > self.window:
+                events.append(ScanEvent(data, rect, timestamp))
+            self.last_read[data] = timestamp
+            self.tracks[data] = (rect, timestamp)
+
+        # Forget the reads older than the window.
+        if len(self.last_read) > 256:
+            self.last_read = {data: seen for (data, seen) in self.last_read.items() if timestamp - seen <= self.window}
+
+        return events
+
+
+class QRCodeUtils(object):
+
+    @staticmethod
+    def decode(frame: np.ndarray, scale: float = 0.5, padding: float = 0.25) -> list:
+        """Decode the QR Codes of a frame. The frame is first decoded downscaled and in grayscale, which is much faster.
+        If nothing is read, only the candidate regions (located on the downscaled frame) are decoded at full resolution.
+
+        Args:
+            frame (np.ndarray): The frame (BGR or grayscale).
+            scale (float, optional): The scale of the downscaled frame. Defaults to 0.5.
+            padding (float, optional): The padding added around a candidate region, relative to its size. Defaults to 0.25.
+
+        Returns:
+            list: The decoded QR Codes, (data, (x, y, w, h)) tuples in the coordinates of the frame.
+        """
+
+        # Convert the frame to grayscale and downscale it.
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale != 1 else gray
+
+        # Decode the downscaled frame.
+        barcodes = QRCodeUtils.decode_region(small)
+        if barcodes:
+            return [(data, tuple(int(round(value / scale)) for value in rect)) for (data, rect) in barcodes]
+        if scale == 1:
+            return []
+
+        # Decode the candidate regions at full resolution.
+        candidates = [(x / scale, y / scale, w / scale, h / scale) for (x, y, w, h) in QRCodeUtils.find_candidates(small)]
+        return QRCodeUtils.decode_regions(gray, candidates, padding)
+
+    @staticmethod
+    def decode_regions(gray: np.ndarray, rects: list, padding: float = 0.25) -> list:
+        """Decode the QR Codes of some regions of a grayscale frame, at full resolution.
+
+        Args:
+            gray (np.ndarray): The grayscale frame.
+            rects (list): The regions, (x, y, w, h) tuples.
+            padding (float, optional): The padding added around a region, relative to its size. Defaults to 0.25.
+
+        Returns:
+            list: The decoded QR Codes, (data, (x, y, w, h)) tuples in the coordinates of the frame. A QR Code found in overlapping regions is only returned once.
+        """
+        barcodes = {}
+        (height, width) = gray.shape[:2]
+        for (x, y, w, h) in rects:
+            x0 = max(0, int(x - w * padding))
+            y0 = max(0, int(y - h * padding))
+            x1 = min(width, int(x + w * (1 + padding)) + 1)
+            y1 = min(height, int(y + h * (1 + padding)) + 1)
+            for (data, (bx, by, bw, bh)) in QRCodeUtils.decode_region(gray[y0:y1, x0:x1]):
+                barcodes.setdefault(data, (bx + x0, by + y0, bw, bh))
+        return list(barcodes.items())
+
+    @staticmethod
+    def decode_region(gray: np.ndarray) -> list:
+        """Decode the QR Codes of a grayscale image with pyzbar.
+
+        Args:
+            gray (np.ndarray): The grayscale image.
+
+        Returns:
+            list: The decoded QR Codes, (data, (x, y, w, h)) tuples.
+        """
+        if gray.size == 0:
+            return []
+        return [(barcode.data.decode('utf-8'), tuple(barcode.rect)) for barcode in pyzbar.decode(gray)]
+
+    @staticmethod
+    def find_candidates(gray: np.ndarray) -> list:
+        """Locate the QR Codes of a grayscale image, without decoding them.
+
+        Args:
+            gray (np.ndarray): The grayscale image.
+
+        Returns:
+            list: The bounding boxes of the candidate regions, (x, y, w, h) tuples.
+        """
+        # Find the corners of the QR Codes. (A detector is cheap to create and is not thread-safe)
+        try:
+            (found, points) = cv2.QRCodeDetector().detectMulti(gray)
+        except cv2.error:
+            return []
+        if not found or points is None:
+            return []
+
+        return [cv2.boundingRect(corners.astype(np.float32)) for corners in points]
+
+    @staticmethod
+    def decode_file(path: str) -> list:
+        """Decode the QR Codes of an image file.
+
+        Args:
+            path (str): The path of the image file.
+
+        Returns:
+            list: The decoded QR Codes, (data, (x, y, w, h)) tuples. Empty if the file cannot be read.
+        """
+        frame = cv2.imread(path)
+        if frame is None:
+            return []
+        return QRCodeUtils.decode(frame)
+
+    @staticmethod
+    def decode_files(paths: list, workers: int = None, chunksize: int = 16):
+        """Decode the QR Codes of many image files across a pool of processes, streaming the results in order.
+
+        Args:
+            paths (list): The paths of the image files (see CameraUtils.list_images).
+            workers (int, optional): The number of processes, 1 to decode in this process. Defaults to None (one per CPU).
+            chunksize (int, optional): The number of files sent to a process at once. Defaults to 16.
+
+        Yields:
+            str: The path of the image file.
+            list: The decoded QR Codes, (data, (x, y, w, h)) tuples.
+        """
+
+        # Decode in this process, without the cost of starting the pool.
+        if workers == 1:
+            for path in paths:
+                yield (path, QRCodeUtils.decode_file(path))
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            paths = list(paths)
+            yield from zip(paths, executor.map(QRCodeUtils.decode_file, paths, chunksize=chunksize))
+
+    @staticmethod
+    def benchmark(frames: list, **kwargs) -> dict:
+        """Measure the decode rate on recorded frames, with the headless decode path.
+
+        Args:
+            frames (list): The frames.
+            **kwargs: The options of QRCodeUtils.decode (scale, padding).
+
+        Returns:
+            dict: The number of frames, the number of frames with a QR Code read, the total time in seconds and the frames decoded per second.
+        """
+        frames = list(frames)
+
+        # Decode every frame.
+        decoded = 0
+        start = time.perf_counter()
+        for frame in frames:
+            if QRCodeUtils.decode(frame, **kwargs):
+                decoded += 1
+        seconds = time.perf_counter() - start
+
+        return {
+            "frames": len(frames),
+            "decoded": decoded,
+            "seconds": seconds,
+            "fps": len(frames) / seconds if seconds > 0 else 0.0
+        }
+
+
 if __name__ == "__main__":
-    qr = QRCode()
-    result = qr.read(camera=CameraUtils.list_cameras()[0])
-    print(result)
+    # Parse the command line.
+    parser = argparse.ArgumentParser(description="Read a QR Code with the camera.")
+    parser.add_argument("--preview", action="store_true", help="show the camera window")
+    parser.add_argument("--benchmark", metavar="PATH", help="measure the decode rate on recorded frames (a video file or a directory of images)")
+    parser.add_argument("--files", metavar="PATH", help="decode the QR Codes of an image file or of a directory of images")
+    parser.add_argument("--scale", type=float, default=0.5, help="scale of the downscaled frame decoded first (default: 0.5)")
+    args = parser.parse_args()
+
+    if args.files:
+        # Decode the image files across a pool of processes.
+        for (path, barcodes) in QRCodeUtils.decode_files(CameraUtils.list_images(args.files, recursive=True)):
+            print(path, [data for (data, rect) in barcodes])
+    elif args.benchmark:
+        # Benchmark the decode rate.
+        result = QRCodeUtils.benchmark(CameraUtils.load_frames(args.benchmark), scale=args.scale)
+        print(f"{result['frames']} frames, {result['decoded']} with a QR Code, {result['seconds']:.2f} s, {result['fps']:.1f} frames/s")
+    else:
+        qr = QRCode()
+        result = qr.read(camera=CameraUtils.list_cameras()[0], showCameraWindow=args.preview)
+        print(result)
@@ -0,0 +1,1349 @@
+# PyxMap
+# Copyright © 2023 Cléry Arque-Ferradou, Nathanaël Lejuste, De Beaumont du Repaire Carla, Chasseigne Ulysse
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import abc
+import base64
+import functools
+import os
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+# Firestore is only needed by the FirestoreStorage, so the offline kiosks can run without it.
+try:
+    from google.api_core import exceptions as google_exceptions
+    from google.cloud import firestore
+    from google.oauth2 import service_account
+except ImportError:
+    google_exceptions = None
+    firestore = None
+    service_account = None
+
+
+class PyxpicAlreadyExists(Exception):
+    """Raised when a pyxpic is created with an id that is already used.
+    """
+
+
+class FirestoreClientProvider(object):
+    """Provides the Firestore client shared by the whole process, so the credentials are read
+    and the gRPC channel is set up once instead of for every capture.
+    """
+
+    # The shared client, created lazily.
+    _client = None
+    _lock = threading.Lock()
+
+    # Minimum time between two health checks, in seconds.
+    HEALTH_CHECK_INTERVAL = 60.0
+    _checked_at = None
+
+    @staticmethod
+    def get_client() -> "firestore.Client":
+        """Get the shared firestore client, creating it the first time.
+
+        Returns:
+            firestore.Client: The firestore client.
+        """
+        client = FirestoreClientProvider._client
+        if client is None:
+            with FirestoreClientProvider._lock:
+                # Another thread may have created it while this one was waiting.
+                if FirestoreClientProvider._client is None:
+                    FirestoreClientProvider._client = FirestoreClientProvider.create_client()
+                client = FirestoreClientProvider._client
+        return client
+
+    @staticmethod
+    def create_client() -> "firestore.Client":
+        """Create a firestore client from the credentials file.
+
+        Returns:
+            firestore.Client: The firestore client.
+        """
+
+        # Get the credentials from the json file.
+        credentials_file_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            "resources", "database_credentials.json"
+        )
+
+        # Create the credentials.
+        with open(credentials_file_path, "r") as f:
+            credentials_raw = f.read()
+            credentials_json = json.loads(credentials_raw)
+            credentials = service_account.Credentials.from_service_account_info(
+                credentials_json)
+
+        # Create the firestore client.
+        return firestore.Client(credentials=credentials)
+
+    @staticmethod
+    def reconnect(stale_client: "firestore.Client" = None) -> "firestore.Client":
+        """Replace the shared client by a new one.
+
+        Args:
+            stale_client (firestore.Client, optional): The client that failed. If another thread already replaced it, the client is not replaced again. Defaults to None (always replace it).
+
+        Returns:
+            firestore.Client: The new firestore client.
+        """
+        with FirestoreClientProvider._lock:
+            old_client = FirestoreClientProvider._client
+            # The old client is not closed, other threads may still be using it. It is garbage-collected once they are done.
+            if stale_client is None or old_client is stale_client:
+                FirestoreClientProvider._client = FirestoreClientProvider.create_client()
+                FirestoreClientProvider._checked_at = None
+            return FirestoreClientProvider._client
+
+    @staticmethod
+    def is_healthy(timeout: float = 2.0) -> bool:
+        """Check if the shared client can reach Firestore, with a cheap query (not retried, so it fails fast when offline).
+
+        Args:
+            timeout (float, optional): The timeout of the query in seconds. Defaults to 2.0.
+
+        Returns:
+            bool: True if Firestore answered, False otherwise.
+        """
+        try:
+            FirestoreClientProvider.get_client().collection("pyxpic").limit(1).get(retry=None, timeout=timeout)
+        except Exception:
+            return False
+        return True
+
+    @staticmethod
+    def check(timeout: float = 2.0) -> bool:
+        """Check the health of the shared client (at most once per HEALTH_CHECK_INTERVAL) and reconnect it if it is unhealthy.
+        Also creates the client, so calling it at startup keeps the channel setup out of the first upload.
+
+        Args:
+            timeout (float, optional): The timeout of the health check in seconds. Defaults to 2.0.
+
+        Returns:
+            bool: True if the client is healthy (or was checked recently), False if it still fails after reconnecting.
+        """
+        checked_at = FirestoreClientProvider._checked_at
+        if checked_at is not None and time.monotonic() - checked_at < FirestoreClientProvider.HEALTH_CHECK_INTERVAL:
+            return True
+
+        client = FirestoreClientProvider.get_client()
+        healthy = FirestoreClientProvider.is_healthy(timeout)
+        if not healthy:
+            FirestoreClientProvider.reconnect(client)
+            healthy = FirestoreClientProvider.is_healthy(timeout)
+        if healthy:
+            FirestoreClientProvider._checked_at = time.monotonic()
+        return healthy
+
+
+def reconnect_on_failure(method):
+    """Decorate a method of a Firestore storage to reconnect the shared client when the connection failed.
+    The error is still raised, so the caller can retry with the new client.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        client = self.db
+        try:
+            return method(self, *args, **kwargs)
+        except Exception as error:
+            if self.shared and isinstance(error, (google_exceptions.ServiceUnavailable, google_exceptions.Unauthenticated)):
+                FirestoreClientProvider.reconnect(client)
+            raise
+
+    return wrapper
+
+
+class FirestoreOrderCounter(object):
+    def __init__(self, db: "firestore.Client" = None, collection: str = "counters", document: str = "pyxpic") -> None:
+        """Initialize the order number counter stored in a Firestore document.
+
+        Args:
+            db (firestore.Client, optional): The firestore client. Defaults to the shared client.
+            collection (str, optional): The collection of the counter document. Defaults to "counters".
+            document (str, optional): The id of the counter document. Defaults to "pyxpic".
+        """
+        self._db = db
+        self.shared = db is None
+        self.collection_name = collection
+        self.document = document
+
+    @property
+    def db(self) -> "firestore.Client":
+        # The shared client is looked up every time, so a reconnected client is used.
+        return self._db if self._db is not None else FirestoreClientProvider.get_client()
+
+    @reconnect_on_failure
+    def allocate(self, count: int = 1) -> int:
+        """Allocate consecutive order numbers atomically, even when several kiosks insert at the same moment.
+
+        Args:
+            count (int, optional): The number of order numbers to allocate. Defaults to 1.
+
+        Returns:
+            int: The first allocated order number.
+        """
+        # Use the same client for the whole transaction, even if it is reconnected meanwhile.
+        db = self.db
+        doc_ref = db.collection(self.collection_name).document(self.document)
+
+        @firestore.transactional
+        def allocate_in_transaction(transaction) -> int:
+            # Read the next order number. (Counting the existing pyxpics the first time)
+            snapshot = doc_ref.get(transaction=transaction)
+            if snapshot.exists:
+                first = snapshot.get("next")
+            else:
+                first = self._count_pyxpic()
+
+            # Reserve the order numbers. (The transaction is retried if another kiosk did it at the same time)
+            transaction.set(doc_ref, {"next": first + count})
+            return first
+
+        return allocate_in_transaction(db.transaction())
+
+    def _count_pyxpic(self) -> int:
+        """Count the pyxpics already in the database, without fetching them.
+
+        Returns:
+            int: The number of pyxpics.
+        """
+        result = self.db.collection("pyxpic").count().get()
+        return int(result[0][0].value)
+
+
+class SQLiteOrderCounter(object):
+    def __init__(self, storage: "SQLiteStorage", name: str = "pyxpic") -> None:
+        """Initialize the order number counter stored in the SQLite database.
+
+        Args:
+            storage (SQLiteStorage): The storage holding the counter.
+            name (str, optional): The name of the counter. Defaults to "pyxpic".
+        """
+        self.storage = storage
+        self.name = name
+
+    def allocate(self, count: int = 1) -> int:
+        """Allocate consecutive order numbers atomically, even when several processes share the database.
+
+        Args:
+            count (int, optional): The number of order numbers to allocate. Defaults to 1.
+
+        Returns:
+            int: The first allocated order number.
+        """
+
+        with self.storage.lock:
+            connection = self.storage.connection
+
+            # Lock the database for writing until the counter is updated.
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                # Start from the number of pyxpics already stored the first time.
+                connection.execute(
+                    "INSERT OR IGNORE INTO counters (name, next) VALUES (?, (SELECT COUNT(*) FROM pyxpic))", (self.name,))
+                first = connection.execute(
+                    "SELECT next FROM counters WHERE name = ?", (self.name,)).fetchone()[0]
+                connection.execute(
+                    "UPDATE counters SET next = ? WHERE name = ?", (first + count, self.name))
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+        return first
+
+
+class Storage(abc.ABC):
+    """Interface of the storage backends used by the Database class.
+    A pyxpic is a dictionary holding its "owner_id", "order_number", "raw_image" and "date".
+    """
+
+    # Maximum number of writes in a batch.
+    BATCH_SIZE = 500
+
+    # Counter allocating the order numbers of the pyxpics.
+    order_counter = None
+
+    @staticmethod
+    def validate_id(pyxpic_id: str) -> str:
+        """Check that a pyxpic id is a UUID (as created by DatabaseUtils), before using it in a file name.
+
+        Args:
+            pyxpic_id (str): The id of the pyxpic.
+
+        Raises:
+            ValueError: If the id is not a UUID in its canonical form.
+
+        Returns:
+            str: The pyxpic id.
+        """
+        try:
+            valid = str(uuid.UUID(pyxpic_id)) == pyxpic_id
+        except (AttributeError, TypeError, ValueError):
+            valid = False
+        if not valid:
+            raise ValueError(f"Invalid pyxpic id: {pyxpic_id!r}")
+        return pyxpic_id
+
+    @abc.abstractmethod
+    def get(self, pyxpic_id: str) -> dict:
+        """Get a pyxpic.
+
+        Args:
+            pyxpic_id (str): The id of the pyxpic.
+
+        Returns:
+            dict: The pyxpic data, None if it does not exist.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def add(self, pyxpic_id: str, data: dict) -> None:
+        """Add a pyxpic.
+
+        Args:
+            pyxpic_id (str): The id of the pyxpic.
+            data (dict): The pyxpic data.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def create(self, pyxpic_id: str, data: dict) -> None:
+        """Add a pyxpic, failing if its id is already used. The check is done by the write itself (no extra round-trip).
+
+        Args:
+            pyxpic_id (str): The id of the pyxpic.
+            data (dict): The pyxpic data.
+
+        Raises:
+            PyxpicAlreadyExists: If the id is already used.
+        """
+        raise NotImplementedError
+
+    def add_many(self, pyxpics: dict) -> None:
+        """Add several pyxpics. Adding a pyxpic that already exists replaces it, so a batch can be retried.
+
+        Args:
+            pyxpics (dict): The pyxpic data, by id.
+        """
+        for (pyxpic_id, data) in pyxpics.items():
+            self.add(pyxpic_id, data)
+
+    def create_many(self, pyxpics: dict) -> list:
+        """Add several pyxpics, skipping the ones whose id is already used (they are never overwritten).
+
+        Args:
+            pyxpics (dict): The pyxpic data, by id.
+
+        Returns:
+            list: The ids already used, whose pyxpic was not added.
+        """
+        conflicts = []
+        for (pyxpic_id, data) in pyxpics.items():
+            try:
+                self.create(pyxpic_id, data)
+            except PyxpicAlreadyExists:
+                conflicts.append(pyxpic_id)
+        return conflicts
+
+    @abc.abstractmethod
+    def update(self, pyxpic_id: str, data: dict) -> None:
+        """Update some fields of a pyxpic.
+
+        Args:
+            pyxpic_id (str): The id of the pyxpic.
+            data (dict): The data to update.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def delete(self, pyxpic_id: str) -> None:
+        """Delete a pyxpic.
+
+        Args:
+            pyxpic_id (str): The id of the pyxpic.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def delete_many(self, pyxpic_ids: list) -> None:
+        """Delete several pyxpics.
+
+        Args:
+            pyxpic_ids (list): The ids of the pyxpics.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def fetch_all(self) -> dict:
+        """Fetch all the pyxpics.
+
+        Returns:
+            dict: The pyxpic data, by id.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def fetch_user(self, owner_id: str) -> dict:
+        """Fetch all the pyxpics of an owner.
+
+        Args:
+            owner_id (str): The id of the owner.
+
+        Returns:
+            dict: The pyxpic data, by id.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def fetch_page(self, owner_id: str = None, fields: list = None, order_by: str = "order_number", page_size: int = 100, cursor=None) -> tuple:
+        """Fetch a page of pyxpics, ordered by a field.
+
+        Args:
+            owner_id (str, optional): Only fetch the pyxpics of this owner. Defaults to None (every owner).
+            fields (list, optional): The fields to fetch (the ordering field is always fetched). Defaults to None (every field).
+            order_by (str, optional): The field ordering the pyxpics: "order_number" or "date". Defaults to "order_number".
+            page_size (int, optional): The maximum number of pyxpics in the page. Defaults to 100.
+            cursor (optional): The cursor returned with the previous page. Defaults to None (first page).
+
+        Returns:
+            dict: The pyxpic data, by id.
+            The cursor of the next page, None if this page is the last one.
+        """
+        raise NotImplementedError
+
+    def watch(self, callback):
+        """Listen to the pyxpics added from now on and to their changes. Backends that cannot listen raise NotImplementedError.
+
+        Args:
+            callback (function): Called with the id and the new data of every added, modified or removed pyxpic (None when removed).
+
+        Returns:
+            The watch, stopped by calling its unsubscribe() method.
+        """
+        raise NotImplementedError
+
+
+class FirestoreStorage(Storage):
+    def __init__(self, db: "firestore.Client" = None, order_counter=None) -> None:
+        """Initialize the Firestore storage.
+
+        Args:
+            db (firestore.Client, optional): The firestore client. Defaults to the client shared by the process (see FirestoreClientProvider).
+            order_counter (optional): The counter allocating the order numbers. Defaults to a FirestoreOrderCounter.
+        """
+        self._db = db
+        self.shared = db is None
+        self.order_counter = order_counter if order_counter is not None else FirestoreOrderCounter(db)
+
+    @property
+    def db(self) -> "firestore.Client":
+        # The shared client is looked up every time, so a reconnected client is used.
+        return self._db if self._db is not None else FirestoreClientProvider.get_client()
+
+    @property
+    def collection(self):
+        return self.db.collection("pyxpic")
+
+    @staticmethod
+    def create_client() -> "firestore.Client":
+        """Create a firestore client from the credentials file. Prefer the shared client of FirestoreClientProvider.
+
+        Returns:
+            firestore.Client: The firestore client.
+        """
+        return FirestoreClientProvider.create_client()
+
+    @reconnect_on_failure
+    def get(self, pyxpic_id: str) -> dict:
+        """Get a pyxpic.
+
+        Args:
+            pyxpic_id (str): The id of the pyxpic.
+
+        Returns:
+            dict: The pyxpic data, None if it does not exist.
+        """
+        return self.collection.document(pyxpic_id).get().to_dict()
+
+    @reconnect_on_failure
+    def add(self, pyxpic_id: str, data: dict) -> None:
+        """Add a pyxpic, replacing the document if it already exists.
+
+        Args:
+            pyxpic_id (str): The id of the pyxpic.
+            data (dict): The pyxpic data.
+        """
+        self.collection.document(pyxpic_id).set(data)
+
+    @reconnect_on_failure
+    def create(self, pyxpic_id: str, data: dict) -> None:
+        """Add a pyxpic, failing if its id is already used. Firestore rejects the write itself (no extra read).
+
+        Args:
+            pyxpic_id (str): The id of the pyxpic.
+            data (dict): The pyxpic data.
+
+        Raises:
+            PyxpicAlreadyExists: If the id is already used.
+        """
+        try:
+            self.collection.document(pyxpic_id).create(data)
+        except google_exceptions.Conflict as error:
+            raise PyxpicAlreadyExists(pyxpic_id) from error
+
+    @reconnect_on_failure
+    def add_many(self, pyxpics: dict) -> None:
+        """Add several pyxpics, replacing the documents that already exist.
+
+        Args:
+            pyxpics (dict): The pyxpic data, by id.
+        """
+        # Commit the pyxpics in batched writes instead of one round-trip each.
+        items = list(pyxpics.items())
+        for start in range(0, len(items), self.BATCH_SIZE):
+            batch = self.db.batch()
+            for (pyxpic_id, data) in items[start:start + self.BATCH_SIZE]:
+                batch.set(self.collection.document(pyxpic_id), data)
+            batch.commit()
+
+    @reconnect_on_failure
+    def create_many(self, pyxpics: dict) -> list:
+        """Add several pyxpics in batched creates, skipping the ones whose id is already used (they are never overwritten).
+
+        Args:
+            pyxpics (dict): The pyxpic data, by id.
+
+        Returns:
+            list: The ids already used, whose pyxpic was not added.
+        """
+        conflicts = []
+        items = list(pyxpics.items())
+        for start in range(0, len(items), self.BATCH_SIZE):
+            chunk = items[start:start + self.BATCH_SIZE]
+            batch = self.db.batch()
+            for (pyxpic_id, data) in chunk:
+                batch.create(self.collection.document(pyxpic_id), data)
+            try:
+                batch.commit()
+            except google_exceptions.Conflict:
+                # A batch is atomic, so nothing was written: create the pyxpics one at a time to find the ones already used.
+                for (pyxpic_id, data) in chunk:
+                    try:
+                        self.collection.document(pyxpic_id).create(data)
+                    except google_exceptions.Conflict:
+                        conflicts.append(pyxpic_id)
+        return conflicts
+
+    @reconnect_on_failure
+    def update(self, pyxpic_id: str, data: dict) -> None:
+        """Update some fields of a pyxpic.
+
+        Args:
+            pyxpic_id (str): The id of the pyxpic.
+            data (dict): The data to update.
+        """
+        self.collection.document(pyxpic_id).update(data)
+
+    @reconnect_on_failure
+    def delete(self, pyxpic_id: str) -> None:
+        """Delete a pyxpic.
+
+        Args:
+            pyxpic_id (str): The id of the pyxpic.
+        """
+        self.collection.document(pyxpic_id).delete()
+
+    @reconnect_on_failure
+    def delete_many(self, pyxpic_ids: list) -> None:
+        """Delete several pyxpics.
+
+        Args:
+            pyxpic_ids (list): The ids of the pyxpics.
+        """
+        # Delete the pyxpics in batched writes instead of one round-trip each.
+        pyxpic_ids = list(pyxpic_ids)
+        for start in range(0, len(pyxpic_ids), self.BATCH_SIZE):
+            batch = self.db.batch()
+            for pyxpic_id in pyxpic_ids[start:start + self.BATCH_SIZE]:
+                batch.delete(self.collection.document(pyxpic_id))
+            batch.commit()
+
+    @reconnect_on_failure
+    def fetch_all(self) -> dict:
+        """Fetch all the pyxpics.
+
+        Returns:
+            dict: The pyxpic data, by id.
+        """
+        return {doc.id: doc.to_dict() for doc in self.collection.stream()}
+
+    @reconnect_on_failure
+    def fetch_user(self, owner_id: str) -> dict:
+        """Fetch all the pyxpics of an owner.
+
+        Args:
+            owner_id (str): The id of the owner.
+
+        Returns:
+            dict: The pyxpic data, by id.
+        """
+        docs = self.collection.where("owner_id", "==", owner_id).stream()
+        return {doc.id: doc.to_dict() for doc in docs}
+
+    @reconnect_on_failure
+    def fetch_page(self, owner_id: str = None, fields: list = None, order_by: str = "order_number", page_size: int = 100, cursor=None) -> tuple:
+        """Fetch a page of pyxpics, ordered by a field.
+
+        Args:
+            owner_id (str, optional): Only fetch the pyxpics of this owner. Defaults to None (every owner).
+            fields (list, optional): The fields to fetch (the ordering field is always fetched). Defaults to None (every field).
+            order_by (str, optional): The field ordering the pyxpics: "order_number" or "date". Defaults to "order_number".
+            page_size (int, optional): The maximum number of pyxpics in the page. Defaults to 100.
+            cursor (optional): The cursor returned with the previous page. Defaults to None (first page).
+
+        Returns:
+            dict: The pyxpic data, by id.
+            DocumentSnapshot: The cursor of the next page (the last pyxpic of this page), None if this page is the last one.
+        """
+        # Select the pyxpics. (Filtering by owner needs a composite index on owner_id and the ordering field)
+        query = self.collection
+        if owner_id is not None:
+            query = query.where("owner_id", "==", owner_id)
+
+        # Only transfer the wanted fields. (The ordering field is needed by the cursor)
+        if fields is not None:
+            query = query.select(list(dict.fromkeys(list(fields) + [order_by])))
+
+        # Start after the last pyxpic of the previous page.
+        query = query.order_by(order_by).limit(page_size)
+        if cursor is not None:
+            query = query.start_after(cursor)
+
+        # The cursor is the snapshot of the last pyxpic of the page.
+        docs = list(query.stream())
+        next_cursor = docs[-1] if len(docs) == page_size else None
+        return ({doc.id: doc.to_dict() for doc in docs}, next_cursor)
+
+    @reconnect_on_failure
+    def watch(self, callback):
+        """Listen to the pyxpics added from now on (and to their changes) with a snapshot listener.
+
+        Args:
+            callback (function): Called with the id and the new data of every added, modified or removed pyxpic (None when removed).
+
+        Returns:
+            Watch: The watch, stopped by calling its unsubscribe() method.
+        """
+        # Forward the changes of the snapshot listener, one pyxpic at a time.
+        def on_snapshot(snapshot, changes, read_time) -> None:
+            for change in changes:
+                data = None if change.type.name == "REMOVED" else change.document.to_dict()
+                callback(change.document.id, data)
+
+        # Only listen to the pyxpics after the current high-water mark, the initial snapshot of the whole collection would download every pyxpic.
+        last = list(self.collection.select(["order_number"]).order_by(
+            "order_number", direction=firestore.Query.DESCENDING).limit(1).stream())
+        high_water_mark = last[0].get("order_number") if last else -1
+        return self.collection.where("order_number", ">", high_water_mark).on_snapshot(on_snapshot)
+
+
+class SQLiteStorage(Storage):
+
+    # Fields stored in their own column, the other ones are stored as JSON.
+    COLUMNS = ("owner_id", "order_number", "date")
+
+    def __init__(self, path: str = "./saves/pyxmap.sqlite3", files_path: str = "./saves/pyxpic") -> None:
+        """Initialize the local storage: the pyxpics are stored in a SQLite database and their raw images in files.
+
+        Args:
+            path (str, optional): The path of the SQLite database. Defaults to "./saves/pyxmap.sqlite3".
+            files_path (str, optional): The directory of the raw image files. Defaults to "./saves/pyxpic".
+        """
+
+        # Initialize class variables.
+        self.path = path
+        self.files_path = files_path
+        self.lock = threading.RLock()
+        os.makedirs(files_path, exist_ok=True)
+
+        # Open the database. (Shared by the threads, behind the lock)
+        self.connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+
+        # Create the tables and their indexes.
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS pyxpic (
+                id TEXT PRIMARY KEY,
+                owner_id TEXT,
+                order_number INTEGER,
+                date TEXT,
+                raw_image_file TEXT,
+                data TEXT NOT NULL DEFAULT '{}'
+            );
+            CREATE INDEX IF NOT EXISTS pyxpic_owner_id ON pyxpic (owner_id);
+            CREATE INDEX IF NOT EXISTS pyxpic_date ON pyxpic (date);
+            CREATE INDEX IF NOT EXISTS pyxpic_order_number ON pyxpic (order_number);
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                next INTEGER NOT NULL
+            );
+        """)
+
+        self.order_counter = SQLiteOrderCounter(self)
+
+    def close(self) -> None:
+        """Close the database.
+        """
+        with self.lock:
+            self.connection.close()
+
+    def get(self, pyxpic_id: str) -> dict:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT id, owner_id, order_number, date, raw_image_file, data FROM pyxpic WHERE id = ?", (pyxpic_id,)).fetchone()
+        return None if row is None else self._row_to_dict(row)
+
+    def add(self, pyxpic_id: str, data: dict) -> None:
+        self._insert("INSERT OR REPLACE", pyxpic_id, data)
+
+    def create(self, pyxpic_id: str, data: dict) -> None:
+        try:
+            self._insert("INSERT", pyxpic_id, data)
+        except sqlite3.IntegrityError as error:
+            raise PyxpicAlreadyExists(pyxpic_id) from error
+
+    def _insert(self, statement: str, pyxpic_id: str, data: dict) -> None:
+        """Insert a pyxpic row, then write its raw image file.
+
+        Args:
+            statement (str): "INSERT" or "INSERT OR REPLACE".
+            pyxpic_id (str): The id of the pyxpic.
+            data (dict): The pyxpic data.
+        """
+        raw_image = data.get("raw_image")
+        raw_image_file = self._raw_image_file_name(pyxpic_id, raw_image)
+        (columns, extra) = self._split(data)
+
+        with self.lock:
+            self.connection.execute(
+                f"{statement} INTO pyxpic (id, owner_id, order_number, date, raw_image_file, data) VALUES (?, ?, ?, ?, ?, ?)",
+                (pyxpic_id, columns["owner_id"], columns["order_number"], columns["date"], raw_image_file, json.dumps(extra)))
+
+            # Write the raw image only once the row is stored, so a failed insert never overwrites another file.
+            try:
+                self._write_raw_image(raw_image_file, raw_image)
+            except BaseException:
+                self.connection.execute("DELETE FROM pyxpic WHERE id = ?", (pyxpic_id,))
+                raise
+
+    def update(self, pyxpic_id: str, data: dict) -> None:
+        with self.lock:
+            # Merge the new data with the stored pyxpic.
+            pyxpic = self.get(pyxpic_id)
+            if pyxpic is None:
+                raise KeyError(f"No pyxpic with the id {pyxpic_id}")
+            pyxpic.update(data)
+
+            # Only rewrite the raw image if it changed.
+            if "raw_image" not in data:
+                pyxpic.pop("raw_image", None)
+                (columns, extra) = self._split(pyxpic)
+                self.connection.execute(
+                    "UPDATE pyxpic SET owner_id = ?, order_number = ?, date = ?, data = ? WHERE id = ?",
+                    (columns["owner_id"], columns["order_number"], columns["date"], json.dumps(extra), pyxpic_id))
+            else:
+                self.add(pyxpic_id, pyxpic)
+
+    def delete(self, pyxpic_id: str) -> None:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT raw_image_file FROM pyxpic WHERE id = ?", (pyxpic_id,)).fetchone()
+            self.connection.execute("DELETE FROM pyxpic WHERE id = ?", (pyxpic_id,))
+
+        # Delete the raw image file.
+        if row is not None and row[0] is not None:
+            try:
+                os.remove(os.path.join(self.files_path, row[0]))
+            except FileNotFoundError:
+                pass
+
+    def delete_many(self, pyxpic_ids: list) -> None:
+        pyxpic_ids = list(pyxpic_ids)
+        with self.lock:
+            # Delete the rows in one transaction.
+            self.connection.execute("BEGIN")
+            try:
+                file_names = []
+                for pyxpic_id in pyxpic_ids:
+                    row = self.connection.execute(
+                        "SELECT raw_image_file FROM pyxpic WHERE id = ?", (pyxpic_id,)).fetchone()
+                    if row is not None and row[0] is not None:
+                        file_names.append(row[0])
+                self.connection.executemany(
+                    "DELETE FROM pyxpic WHERE id = ?", [(pyxpic_id,) for pyxpic_id in pyxpic_ids])
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+
+        # Delete the raw image files.
+        for file_name in file_names:
+            try:
+                os.remove(os.path.join(self.files_path, file_name))
+            except FileNotFoundError:
+                pass
+
+    def fetch_all(self) -> dict:
+        return self._fetch("", ())
+
+    def fetch_user(self, owner_id: str) -> dict:
+        return self._fetch("WHERE owner_id = ?", (owner_id,))
+
+    def fetch_page(self, owner_id: str = None, fields: list = None, order_by: str = "order_number", page_size: int = 100, cursor=None) -> tuple:
+        if order_by not in ("order_number", "date"):
+            raise ValueError(f"Cannot order the pyxpics by {order_by}")
+
+        # Select the pyxpics after the cursor, a (value, id) pair. (Keyset pagination, using the index of the ordering field)
+        conditions = []
+        parameters = []
+        if owner_id is not None:
+            conditions.append("owner_id = ?")
+            parameters.append(owner_id)
+        if cursor is not None:
+            conditions.append(f"({order_by}, id) > (?, ?)")
+            parameters.extend(cursor)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT id, owner_id, order_number, date, raw_image_file, data, {order_by} FROM pyxpic {where} ORDER BY {order_by}, id LIMIT ?",
+                parameters + [page_size]).fetchall()
+
+        # Only read the wanted fields. (The raw image file is not read if it is not wanted)
+        pyxpics = {}
+        for row in rows:
+            if fields is not None and "raw_image" not in fields:
+                row = row[:4] + (None,) + row[5:6]
+            pyxpic = self._row_to_dict(row[:6])
+            if fields is not None:
+                pyxpic = {key: value for (key, value) in pyxpic.items() if key in fields or key == order_by}
+            pyxpics[row[0]] = pyxpic
+
+        next_cursor = (rows[-1][6], rows[-1][0]) if len(rows) == page_size else None
+        return (pyxpics, next_cursor)
+
+    def _fetch(self, where: str, parameters: tuple) -> dict:
+        """Fetch the pyxpics matching a condition, by order number.
+
+        Args:
+            where (str): The WHERE clause.
+            parameters (tuple): The parameters of the WHERE clause.
+
+        Returns:
+            dict: The pyxpics, by id.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT id, owner_id, order_number, date, raw_image_file, data FROM pyxpic {where} ORDER BY order_number",
+                parameters).fetchall()
+        return {row[0]: self._row_to_dict(row) for row in rows}
+
+    def _split(self, data: dict) -> tuple:
+        """Split a pyxpic into its column values and its other fields.
+
+        Args:
+            data (dict): The pyxpic.
+
+        Returns:
+            dict: The column values.
+            dict: The other fields (without the raw image).
+        """
+        columns = {column: data.get(column) for column in SQLiteStorage.COLUMNS}
+        if isinstance(columns["date"], datetime):
+            columns["date"] = columns["date"].isoformat()
+        extra = {key: value for (key, value) in data.items()
+                 if key not in SQLiteStorage.COLUMNS and key != "raw_image"}
+        return (columns, extra)
+
+    def _row_to_dict(self, row: tuple) -> dict:
+        """Convert a row of the pyxpic table to a pyxpic.
+
+        Args:
+            row (tuple): The row.
+
+        Returns:
+            dict: The pyxpic.
+        """
+        (pyxpic_id, owner_id, order_number, date, raw_image_file, data) = row
+        pyxpic = json.loads(data)
+        pyxpic.update({
+            "owner_id": owner_id,
+            "order_number": order_number,
+            "raw_image": self._read_raw_image(raw_image_file),
+            "date": datetime.fromisoformat(date) if date is not None else None
+        })
+        return pyxpic
+
+    def _raw_image_file_name(self, pyxpic_id: str, raw_image) -> str:
+        """Get the name of the file of a raw image. Bytes are written as is (.bin), other values as JSON (.json).
+
+        Args:
+            pyxpic_id (str): The id of the pyxpic.
+            raw_image: The raw image.
+
+        Returns:
+            str: The name of the file.
+        """
+        # The id becomes a file name, so it must not be able to point outside the directory.
+        Storage.validate_id(pyxpic_id)
+        return f"{pyxpic_id}.bin" if isinstance(raw_image, (bytes, bytearray)) else f"{pyxpic_id}.json"
+
+    def _write_raw_image(self, file_name: str, raw_image) -> None:
+        """Write a raw image in its file.
+
+        Args:
+            file_name (str): The name of the file.
+            raw_image: The raw image.
+        """
+        if file_name.endswith(".bin"):
+            with open(os.path.join(self.files_path, file_name), "wb") as f:
+                f.write(raw_image)
+        else:
+            with open(os.path.join(self.files_path, file_name), "w") as f:
+                json.dump(raw_image, f)
+
+    def _read_raw_image(self, file_name: str):
+        """Read a raw image from its file.
+
+        Args:
+            file_name (str): The name of the file.
+
+        Returns:
+            The raw image.
+        """
+        if file_name is None:
+            return None
+        path = os.path.join(self.files_path, file_name)
+        if file_name.endswith(".bin"):
+            with open(path, "rb") as f:
+                return f.read()
+        with open(path, "r") as f:
+            return json.load(f)
+
+
+class QueuedStorage(Storage):
+
+    # The order numbers are allocated by the remote storage when the pyxpics are synced.
+    order_counter = None
+
+    def __init__(self, remote: Storage, path: str = "./saves/outbox.sqlite3", batch_size: int = 500, interval: float = 1.0, max_backoff: float = 60.0) -> None:
+        """Initialize a storage recording the new pyxpics in a local write-ahead log right away.
+        A sync worker then flushes them to the remote storage in batches.
+
+        Args:
+            remote (Storage): The remote storage (usually a FirestoreStorage).
+            path (str, optional): The path of the write-ahead log (a SQLite database). Defaults to "./saves/outbox.sqlite3".
+            batch_size (int, optional): Maximum number of pyxpics synced at once. Defaults to 500.
+            interval (float, optional): Time (in seconds) between two syncs when the log is empty. Defaults to 1.0.
+            max_backoff (float, optional): Maximum time (in seconds) between two attempts when the sync fails. Defaults to 60.0.
+        """
+
+        # Initialize class variables.
+        self.remote = remote
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.lock = threading.RLock()
+        self.wake_up = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.running = False
+
+        # Ids of the batch being written to the remote storage.
+        self.in_flight = set()
+
+        # Sync statistics.
+        self.synced = 0
+        self.conflicts = 0
+        self.failures = 0
+        self.last_error = None
+
+        # Open the write-ahead log.
+        self.connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                sequence INTEGER PRIMARY KEY AUTOINCREMENT,
+                id TEXT UNIQUE NOT NULL,
+                data TEXT NOT NULL,
+                mode TEXT NOT NULL DEFAULT 'create'
+            )
+        """)
+
+        # Pyxpics whose id was already used by another pyxpic in the remote storage, set aside instead of overwriting it.
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS conflicts (
+                id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                remote_data TEXT
+            )
+        """)
+
+        # Pyxpics deleted while their batch was being written, to delete from the remote storage once it is written.
+        self.connection.execute("CREATE TABLE IF NOT EXISTS tombstones (id TEXT PRIMARY KEY)")
+
+    def __enter__(self) -> "QueuedStorage":
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def start(self) -> "QueuedStorage":
+        """Start the sync worker, if it is not already running.
+
+        Returns:
+            QueuedStorage: The started storage.
+        """
+
+        if self.thread is None:
+            self.running = True
+            self.stopped.clear()
+            self.thread = threading.Thread(
+                target=self._run, name="QueuedStorage", daemon=True)
+            self.thread.start()
+
+        # Return the storage.
+        return self
+
+    def stop(self, flush: bool = True) -> None:
+        """Stop the sync worker.
+
+        Args:
+            flush (bool, optional): Try to sync the pending pyxpics one last time. Defaults to True.
+        """
+
+        self.running = False
+        self.stopped.set()
+        self.wake_up.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+        if flush:
+            try:
+                self.flush()
+            except Exception as error:
+                self.last_error = error
+
+    def depth(self) -> int:
+        """Get the number of pyxpics waiting to be synced.
+
+        Returns:
+            int: The depth of the queue.
+        """
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def flush(self) -> int:
+        """Sync the pending pyxpics to the remote storage, one batch at a time, until the log is empty.
+        Raises the error of the remote storage if a batch fails (the batch stays in the log).
+
+        Returns:
+            int: The number of pyxpics synced.
+        """
+
+        synced = 0
+        while True:
+            # Delete the pyxpics removed while a previous batch was being written.
+            self._flush_tombstones()
+
+            # Claim the next batch. (From now on, deleting one of its pyxpics leaves a tombstone)
+            with self.lock:
+                rows = self.connection.execute(
+                    "SELECT id, data, mode FROM outbox ORDER BY sequence LIMIT ?", (self.batch_size,)).fetchall()
+                if not rows:
+                    return synced
+                self.in_flight = {pyxpic_id for (pyxpic_id, data, mode) in rows}
+
+            try:
+                original_blobs = {pyxpic_id: data for (pyxpic_id, data, mode) in rows}
+                blobs = dict(original_blobs)
+                modes = {pyxpic_id: mode for (pyxpic_id, data, mode) in rows}
+                pyxpics = {pyxpic_id: QueuedStorage._loads(data) for (pyxpic_id, data, mode) in rows}
+
+                # Allocate the missing order numbers in one go, and keep them in the log so a retry reuses them.
+                missing = [pyxpic_id for (pyxpic_id, data) in pyxpics.items() if data.get("order_number") is None]
+                if missing:
+                    first = self.remote.order_counter.allocate(len(missing))
+                    with self.lock:
+                        for (offset, pyxpic_id) in enumerate(missing):
+                            pyxpics[pyxpic_id]["order_number"] = first + offset
+                            blobs[pyxpic_id] = QueuedStorage._dumps(pyxpics[pyxpic_id])
+                            self.connection.execute(
+                                "UPDATE outbox SET data = ? WHERE id = ? AND data = ?",
+                                (blobs[pyxpic_id], pyxpic_id, original_blobs[pyxpic_id]))
+
+                # Do not write the pyxpics already deleted. (The ones deleted during the write are deleted afterwards)
+                with self.lock:
+                    for pyxpic_id in list(pyxpics):
+                        if self.connection.execute("DELETE FROM tombstones WHERE id = ?", (pyxpic_id,)).rowcount:
+                            del pyxpics[pyxpic_id]
+                            del blobs[pyxpic_id]
+
+                # Write the batch. The new pyxpics are created, so a replayed batch never overwrites a document:
+                # the ids already used are checked below. The pyxpics added with add() replace their document.
+                created = {pyxpic_id: data for (pyxpic_id, data) in pyxpics.items() if modes[pyxpic_id] == "create"}
+                replaced = {pyxpic_id: data for (pyxpic_id, data) in pyxpics.items() if modes[pyxpic_id] != "create"}
+                conflicts = self.remote.create_many(created) if created else []
+                if replaced:
+                    self.remote.add_many(replaced)
+
+                # An id already used by the same pyxpic was written by a previous attempt. Otherwise, it is a conflict.
+                rejected = {}
+                for pyxpic_id in conflicts:
+                    remote_data = self.remote.get(pyxpic_id)
+                    if remote_data is None:
+                        # Deleted in the meantime, it is created again by the next batch.
+                        del blobs[pyxpic_id]
+                    elif not QueuedStorage._same_pyxpic(remote_data, pyxpics[pyxpic_id]):
+                        rejected[pyxpic_id] = remote_data
+            except BaseException:
+                with self.lock:
+                    self.in_flight = set()
+                raise
+
+            with self.lock:
+                # Set the conflicting pyxpics aside, so they can be reviewed.
+                for (pyxpic_id, remote_data) in rejected.items():
+                    self.connection.execute(
+                        "INSERT OR REPLACE INTO conflicts (id, data, remote_data) VALUES (?, ?, ?)",
+                        (pyxpic_id, blobs.pop(pyxpic_id), QueuedStorage._dumps(remote_data)))
+                    self.connection.execute("DELETE FROM outbox WHERE id = ?", (pyxpic_id,))
+
+                # Remove the synced pyxpics from the log, unless they were changed in the meantime.
+                # (Then the document written is ours, the next batch replaces it)
+                for (pyxpic_id, data) in blobs.items():
+                    if not self.connection.execute(
+                            "DELETE FROM outbox WHERE id = ? AND data = ?", (pyxpic_id, data)).rowcount:
+                        self.connection.execute("UPDATE outbox SET mode = 'replace' WHERE id = ?", (pyxpic_id,))
+                self.in_flight = set()
+            synced += len(blobs)
+            self.synced += len(blobs)
+            self.conflicts += len(rejected)
+
+    def get_conflicts(self) -> dict:
+        """Get the pyxpics set aside because their id was already used by another pyxpic in the remote storage.
+
+        Returns:
+            dict: The pyxpic data and the data of the remote pyxpic ("data" and "remote_data"), by id.
+        """
+        with self.lock:
+            rows = self.connection.execute("SELECT id, data, remote_data FROM conflicts").fetchall()
+        return {pyxpic_id: {"data": QueuedStorage._loads(data), "remote_data": QueuedStorage._loads(remote_data)}
+                for (pyxpic_id, data, remote_data) in rows}
+
+    @staticmethod
+    def _same_pyxpic(remote_data: dict, data: dict) -> bool:
+        """Check if a remote pyxpic is a pyxpic of the log written by a previous attempt. The dates are not compared,
+        the remote storage may return them in another time zone. (The order number is allocated for this pyxpic only)
+
+        Args:
+            remote_data (dict): The remote pyxpic data.
+            data (dict): The pyxpic data of the log.
+
+        Returns:
+            bool: True if they are the same pyxpic.
+        """
+        keys = (set(remote_data) | set(data)) - {"date"}
+        return all(remote_data.get(key) == data.get(key) for key in keys)
+
+    def _flush_tombstones(self) -> None:
+        """Delete from the remote storage the pyxpics deleted while their batch was being written.
+        """
+        with self.lock:
+            pyxpic_ids = [row[0] for row in self.connection.execute("SELECT id FROM tombstones").fetchall()]
+        if not pyxpic_ids:
+            return
+
+        self.remote.delete_many(pyxpic_ids)
+        with self.lock:
+            self.connection.executemany("DELETE FROM tombstones WHERE id = ?", [(pyxpic_id,) for pyxpic_id in pyxpic_ids])
+
+    @staticmethod
+    def _dumps(data: dict) -> str:
+        """Serialize a pyxpic for the log, as JSON. Dates are stored in ISO 8601 and bytes in base64.
+
+        Args:
+            data (dict): The pyxpic data.
+
+        Returns:
+            str: The serialized pyxpic. (The keys are sorted, so the same pyxpic always gives the same text)
+        """
+        def default(value):
+            if isinstance(value, datetime):
+                return {"$date": value.isoformat()}
+            if isinstance(value, (bytes, bytearray)):
+                return {"$bytes": base64.b64encode(value).decode("ascii")}
+            raise TypeError(f"Cannot store a {type(value).__name__} in the log")
+
+        return json.dumps(data, default=default, sort_keys=True)
+
+    @staticmethod
+    def _loads(text: str) -> dict:
+        """Deserialize a pyxpic of the log.
+
+        Args:
+            text (str): The serialized pyxpic.
+
+        Returns:
+            dict: The pyxpic data.
+        """
+        def object_hook(value: dict):
+            if len(value) == 1 and "$date" in value:
+                return datetime.fromisoformat(value["$date"])
+            if len(value) == 1 and "$bytes" in value:
+                return base64.b64decode(value["$bytes"])
+            return value
+
+        return json.loads(text, object_hook=object_hook)
+
+    def _run(self) -> None:
+        """Sync the log until the worker is stopped, backing off exponentially when the remote storage fails.
+        """
+
+        delay = self.interval
+        while self.running:
+            try:
+                self.flush()
+            except Exception as error:
+                self.failures += 1
+                self.last_error = error
+
+                # Back off, without being woken up by the new pyxpics. (Only by stop())
+                delay = min(self.max_backoff, delay * 2)
+                self.stopped.wait(delay)
+                continue
+
+            # Wait for the next sync. (Woken up early by a new pyxpic or by stop())
+            delay = self.interval
+            self.wake_up.wait(self.interval)
+            self.wake_up.clear()
+
+    def get(self, pyxpic_id: str) -> dict:
+        # Pending pyxpics are read from the log.
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT data FROM outbox WHERE id = ?", (pyxpic_id,)).fetchone()
+        if row is not None:
+            return QueuedStorage._loads(row[0])
+        return self.remote.get(pyxpic_id)
+
+    def add(self, pyxpic_id: str, data: dict) -> None:
+        # Record the pyxpic in the log and let the worker sync it.
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO outbox (id, data, mode) VALUES (?, ?, 'replace')", (pyxpic_id, QueuedStorage._dumps(dict(data))))
+            # Added again after being deleted, the sync writes it again instead of deleting it.
+            self.connection.execute("DELETE FROM tombstones WHERE id = ?", (pyxpic_id,))
+        self.wake_up.set()
+
+    def create(self, pyxpic_id: str, data: dict) -> None:
+        # Only the pending pyxpics are checked, checking the remote storage would need a round-trip.
+        try:
+            with self.lock:
+                self.connection.execute(
+                    "INSERT INTO outbox (id, data) VALUES (?, ?)", (pyxpic_id, QueuedStorage._dumps(dict(data))))
+                self.connection.execute("DELETE FROM tombstones WHERE id = ?", (pyxpic_id,))
+        except sqlite3.IntegrityError as error:
+            raise PyxpicAlreadyExists(pyxpic_id) from error
+        self.wake_up.set()
+
+    def update(self, pyxpic_id: str, data: dict) -> None:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT data FROM outbox WHERE id = ?", (pyxpic_id,)).fetchone()
+            if row is not None:
+                # Update the pending pyxpic in the log.
+                pyxpic = QueuedStorage._loads(row[0])
+                pyxpic.update(data)
+                self.connection.execute(
+                    "UPDATE outbox SET data = ? WHERE id = ?", (QueuedStorage._dumps(pyxpic), pyxpic_id))
+                return
+        self.remote.update(pyxpic_id, data)
+
+    def delete(self, pyxpic_id: str) -> None:
+        if not self._delete_pending(pyxpic_id):
+            self.remote.delete(pyxpic_id)
+
+    def delete_many(self, pyxpic_ids: list) -> None:
+        # Only delete from the remote storage the pyxpics that are not pending.
+        remote_ids = [pyxpic_id for pyxpic_id in pyxpic_ids if not self._delete_pending(pyxpic_id)]
+        if remote_ids:
+            self.remote.delete_many(remote_ids)
+
+    def _delete_pending(self, pyxpic_id: str) -> bool:
+        """Delete a pyxpic from the log. If its batch is being written, a tombstone makes the sync delete it from the remote storage afterwards.
+
+        Args:
+            pyxpic_id (str): The id of the pyxpic.
+
+        Returns:
+            bool: True if the pyxpic was pending, False if it is only in the remote storage.
+        """
+        with self.lock:
+            if not self.connection.execute("DELETE FROM outbox WHERE id = ?", (pyxpic_id,)).rowcount:
+                return False
+            if pyxpic_id in self.in_flight:
+                self.connection.execute("INSERT OR IGNORE INTO tombstones (id) VALUES (?)", (pyxpic_id,))
+            return True
+
+    def fetch_all(self) -> dict:
+        pyxpics = self.remote.fetch_all()
+        pyxpics.update(self._pending())
+        return pyxpics
+
+    def fetch_user(self, owner_id: str) -> dict:
+        pyxpics = self.remote.fetch_user(owner_id)
+        pyxpics.update({pyxpic_id: data for (pyxpic_id, data) in self._pending().items()
+                        if data.get("owner_id") == owner_id})
+        return pyxpics
+
+    def fetch_page(self, owner_id: str = None, fields: list = None, order_by: str = "order_number", page_size: int = 100, cursor=None) -> tuple:
+        # The pages only list the synced pyxpics, the pending ones have no order number yet.
+        return self.remote.fetch_page(owner_id, fields, order_by, page_size, cursor)
+
+    def watch(self, callback):
+        # The changes made by this kiosk are pending in the log, the listener of the remote storage reports the other ones.
+        return self.remote.watch(callback)
+
+    def _pending(self) -> dict:
+        """Get the pyxpics waiting to be synced.
+
+        Returns:
+            dict: The pyxpic data, by id.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT id, data FROM outbox ORDER BY sequence").fetchall()
+        return {pyxpic_id: QueuedStorage._loads(data) for (pyxpic_id, data) in rows}
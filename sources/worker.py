@@ -0,0 +1,143 @@
+# PyxMap
+# Copyright © 2023 Cléry Arque-Ferradou, Nathanaël Lejuste, De Beaumont du Repaire Carla, Chasseigne Ulysse
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import queue
+import threading
+import time
+
+
+class WorkQueue(object):
+    def __init__(self, workers: int = 2, max_size: int = 16, retries: int = 3, backoff: float = 0.5) -> None:
+        """Initialize a bounded work queue run by a pool of background workers.
+
+        Args:
+            workers (int, optional): Number of worker threads. Defaults to 2.
+            max_size (int, optional): Maximum number of pending tasks. Submitting blocks when it is reached. Defaults to 16.
+            retries (int, optional): Number of times a failed task is retried. Defaults to 3.
+            backoff (float, optional): Delay (in seconds) before the first retry, doubled at each retry. Defaults to 0.5.
+        """
+
+        # Initialize class variables.
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.tasks = queue.Queue(maxsize=max_size)
+        self.threads = []
+        self.lock = threading.Lock()
+
+        # Counters.
+        self.completed = 0
+        self.failed = 0
+        self.last_error = None
+
+    def __enter__(self) -> "WorkQueue":
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+
+    def start(self) -> "WorkQueue":
+        """Start the workers, if they are not already running.
+
+        Returns:
+            WorkQueue: The started queue.
+        """
+
+        if not self.threads:
+            for i in range(self.workers):
+                thread = threading.Thread(
+                    target=self._run, name=f"WorkQueue-{i}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+        # Return the queue.
+        return self
+
+    def submit(self, function, *args, timeout: float = None, retries: int = None, **kwargs) -> bool:
+        """Submit a task to the workers. Blocks while the queue is full (backpressure).
+
+        Args:
+            function (callable): The function to run.
+            *args: The positional arguments of the function.
+            timeout (float, optional): Maximum time (in seconds) to wait for a free slot. Defaults to None (wait forever).
+            retries (int, optional): Number of times the task is retried if it fails. Defaults to the retries of the queue.
+            **kwargs: The keyword arguments of the function.
+
+        Returns:
+            bool: True if the task was queued, False if the queue stayed full until the timeout.
+        """
+
+        # Start the workers the first time a task is submitted.
+        self.start()
+
+        try:
+            self.tasks.put((function, args, kwargs, self.retries if retries is None else retries), timeout=timeout)
+        except queue.Full:
+            return False
+        return True
+
+    def pending(self) -> int:
+        """Get the number of tasks waiting for a worker.
+
+        Returns:
+            int: The number of pending tasks.
+        """
+        return self.tasks.qsize()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the workers once every pending task is done (graceful drain).
+
+        Args:
+            wait (bool, optional): Wait for the workers to finish. Defaults to True.
+        """
+
+        # One stop signal per worker, queued after the pending tasks.
+        for thread in self.threads:
+            self.tasks.put(None)
+
+        # Wait for the workers.
+        if wait:
+            for thread in self.threads:
+                thread.join()
+        self.threads = []
+
+    def _run(self) -> None:
+        """Run the tasks until the stop signal is received.
+        """
+
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                break
+
+            (function, args, kwargs, retries) = task
+            for attempt in range(retries + 1):
+                try:
+                    function(*args, **kwargs)
+                except Exception as error:
+                    # Wait before retrying, longer and longer.
+                    with self.lock:
+                        self.last_error = error
+                    if attempt < retries:
+                        time.sleep(self.backoff * 2 ** attempt)
+                        continue
+                    with self.lock:
+                        self.failed += 1
+                else:
+                    with self.lock:
+                        self.completed += 1
+                break
@@ -0,0 +1,34 @@
+import threading
+import time
+
+
+class FakeCameraBackend(object):
+    # Camera backend simulating devices, to test the camera discovery without hardware.
+    def __init__(self, available, delays=None, indices=None):
+        self.available = list(available)
+        self.delays = delays or {}
+        self.indices = list(range(10)) if indices is None else list(indices)
+        self.probe_count = 0
+        self.probed = []
+
+    def candidates(self):
+        return list(self.indices)
+
+    def probe(self, index):
+        self.probe_count += 1
+        self.probed.append(index)
+        time.sleep(self.delays.get(index, 0))
+        return index in self.available
+
+
+class MemoryOrderCounter(object):
+    # Order number counter kept in memory, to test the allocation without Firestore.
+    def __init__(self, first=0):
+        self.next = first
+        self.lock = threading.Lock()
+
+    def allocate(self, count=1):
+        with self.lock:
+            first = self.next
+            self.next += count
+            return first
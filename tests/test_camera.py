@@ -0,0 +1,212 @@
+import os
+import re
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from camera import Camera, CameraUtils, FrameGrabber, ImageDirectorySource
+from fakes import FakeCameraBackend
+
+
+def baseline_ascii_frame(normal_frame, gray_frame, color):
+    # The per-pixel implementation the NumPy look-up tables replaced.
+    chars = "  .:-=+*#%@"
+    final_frame = ""
+    for (row_number, row) in enumerate(normal_frame):
+        for (line_number, pixel) in enumerate(row):
+            char = chars[int((len(chars) - 1) * (gray_frame[row_number][line_number] / 255.0))]
+            if color:
+                final_frame += '\033[38;2;{};{};{}m'.format(pixel[2], pixel[1], pixel[0]) + char + "\033[0m"
+            else:
+                final_frame += char
+        if len(row) != 0:
+            final_frame += "\n"
+    return final_frame
+
+
+def parse_cells(frame):
+    # Split a colored frame into lines of (character, color) cells, whatever the escape sequences emitted.
+    lines = [[]]
+    color = None
+    for (escape, char) in re.findall(r"\033\[([0-9;]*)m|(.|\n)", frame):
+        if escape:
+            color = None if escape == "0" else escape
+        elif char == "\n":
+            lines.append([])
+        else:
+            lines[-1].append((char, color))
+    return lines
+
+
+def get_frames(height, width, seed=0):
+    normal_frame = np.random.default_rng(seed).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    gray_frame = np.random.default_rng(seed + 1).integers(0, 256, (height, width), dtype=np.uint8)
+    return (normal_frame, gray_frame)
+
+
+SHAPES = [(0, 0), (3, 0), (0, 5), (1, 1), (1, 17), (17, 1), (24, 80)]
+
+
+@pytest.fixture
+def camera():
+    # The camera is only used for its conversion, the device is never opened.
+    return Camera(camera_index=0)
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+def test_plain_frame_matches_baseline(camera, shape):
+    (normal_frame, gray_frame) = get_frames(*shape)
+    ascii_frame = camera.get_ascii_frame(normal_frame, gray_frame, color=False)
+    assert ascii_frame == baseline_ascii_frame(normal_frame, gray_frame, color=False)
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+def test_colored_frame_matches_baseline(camera, shape):
+    (normal_frame, gray_frame) = get_frames(*shape)
+    ascii_frame = camera.get_ascii_frame(normal_frame, gray_frame, color=True)
+    assert parse_cells(ascii_frame) == parse_cells(baseline_ascii_frame(normal_frame, gray_frame, color=True))
+
+
+def test_colored_frame_with_uniform_color(camera):
+    # A line of a single color only needs one escape sequence.
+    normal_frame = np.full((2, 6, 3), 200, dtype=np.uint8)
+    gray_frame = np.arange(12, dtype=np.uint8).reshape(2, 6) * 20
+    ascii_frame = camera.get_ascii_frame(normal_frame, gray_frame, color=True)
+    assert ascii_frame.count("\033[38;2;") == 2
+    assert parse_cells(ascii_frame) == parse_cells(baseline_ascii_frame(normal_frame, gray_frame, color=True))
+
+
+def test_every_gray_level_matches_convert_ascii():
+    lut = CameraUtils.get_ascii_lut()
+    assert [lut[value] for value in range(256)] == [CameraUtils.convert_ascii(value) for value in range(256)]
+
+
+class BlockingCapture(object):
+    # A capture whose read() blocks until it is allowed to return.
+    def __init__(self):
+        self.reading = threading.Event()
+        self.unblock = threading.Event()
+        self.released = threading.Event()
+        self.reads = 0
+
+    def read(self):
+        self.reads += 1
+        if self.reads > 1:
+            self.reading.set()
+            self.unblock.wait()
+        return True, np.zeros((2, 2, 3), dtype=np.uint8)
+
+    def release(self):
+        assert not self.reading.is_set() or self.unblock.is_set(), "released during a read"
+        self.released.set()
+
+
+def test_frame_grabber_releases_after_the_read_returns():
+    capture = BlockingCapture()
+    grabber = FrameGrabber(capture).start()
+    assert capture.reading.wait(1.0)
+
+    grabber.stop(timeout=0.05, release=True)
+    assert not capture.released.is_set()
+
+    capture.unblock.set()
+    assert capture.released.wait(1.0)
+
+
+def test_frame_grabber_drops_buffered_frames_on_stop():
+    capture = BlockingCapture()
+    grabber = FrameGrabber(capture).start()
+    assert capture.reading.wait(1.0)
+
+    grabber.stop(timeout=0.05)
+    capture.unblock.set()
+    assert grabber.next(timeout=0.1) == (False, None)
+    assert grabber.latest()[0] is False
+
+
+def test_list_cameras_keeps_working_cameras_in_order():
+    backend = FakeCameraBackend(available=[4, 0, 2], indices=[4, 3, 2, 1, 0])
+    assert CameraUtils.list_cameras(backend=backend) == [0, 2, 4]
+
+    # The result is cached.
+    assert CameraUtils.list_cameras(backend=backend) == [0, 2, 4]
+    assert backend.probe_count == 5
+
+
+def test_list_cameras_ignores_slow_devices():
+    backend = FakeCameraBackend(available=[0, 1], delays={1: 0.5}, indices=[0, 1])
+    assert CameraUtils.list_cameras(timeout=0.1, backend=backend) == [0]
+
+
+def test_list_cameras_does_not_probe_a_busy_device_again():
+    backend = FakeCameraBackend(available=[0, 1], delays={1: 0.5}, indices=[0, 1])
+    assert CameraUtils.list_cameras(timeout=0.1, backend=backend) == [0]
+
+    # The probe of the device 1 has not returned yet, so it is skipped.
+    assert CameraUtils.list_cameras(timeout=0.1, ttl=0, backend=backend) == [0]
+    assert backend.probed == [0, 1, 0]
+
+    # Once it returned, the device is probed again.
+    time.sleep(0.5)
+    assert CameraUtils.list_cameras(timeout=1.0, ttl=0, backend=backend) == [0, 1]
+
+
+@pytest.mark.parametrize("ascii_frame", ["", "\n", "\n\n"])
+def test_render_empty_ascii_frame(ascii_frame):
+    with pytest.raises(ValueError):
+        CameraUtils.render_ascii_image(ascii_frame)
+
+
+def test_render_single_character(monkeypatch, tmp_path):
+    # The font path is relative to the sources directory.
+    monkeypatch.chdir(os.path.join(os.path.dirname(__file__), "..", "sources"))
+    image = CameraUtils.render_ascii_image("@\n", np.full((1, 1, 3), 255, dtype=np.uint8))
+    assert image.size[0] > 0 and image.size[1] > 0
+    image.save(str(tmp_path / "frame.png"))
+
+
+def test_get_frames_of_an_exhausted_source(tmp_path):
+    cv2.imwrite(str(tmp_path / "frame.png"), np.full((40, 40, 3), 128, dtype=np.uint8))
+    (tmp_path / "notes.txt").write_text("not an image")
+    source = ImageDirectorySource(str(tmp_path))
+    assert source.files == [str(tmp_path / "frame.png")]
+
+    camera = Camera(scale=5, session=source)
+    (normal_frame, gray_frame) = camera.get_frames(camera.capture())
+    assert normal_frame is not None and gray_frame.shape == normal_frame.shape[:2]
+    assert camera.get_frames(camera.capture()) == (None, None)
+
+
+def test_list_images(tmp_path):
+    for name in ("b.png", "a.JPG", "c.txt", "sub/d.png"):
+        (tmp_path / name).parent.mkdir(exist_ok=True)
+        (tmp_path / name).write_bytes(b"")
+
+    assert CameraUtils.list_images(str(tmp_path)) == [str(tmp_path / "a.JPG"), str(tmp_path / "b.png")]
+    assert CameraUtils.list_images(str(tmp_path), recursive=True)[-1] == str(tmp_path / "sub" / "d.png")
+    assert CameraUtils.list_images(str(tmp_path / "b.png")) == [str(tmp_path / "b.png")]
+
+
+class DeadCapture(object):
+    # A capture whose device stopped giving frames.
+    def read(self):
+        time.sleep(0.001)
+        return False, None
+
+    def release(self):
+        pass
+
+
+def test_frame_grabber_read_fails_when_the_device_stops(monkeypatch):
+    monkeypatch.setattr(FrameGrabber, "READ_TIMEOUT", 0.1)
+    grabber = FrameGrabber(DeadCapture()).start()
+    try:
+        started = time.monotonic()
+        assert grabber.read() == (False, None)
+        assert time.monotonic() - started < 1.0
+        assert grabber.read_failures > 0
+    finally:
+        grabber.stop()
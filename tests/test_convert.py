@@ -0,0 +1,71 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from convert import Converter
+
+
+def write_image(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    cv2.imwrite(path, np.full((40, 40, 3), 200, dtype=np.uint8))
+
+
+def test_outputs_are_named_after_the_relative_paths(tmp_path):
+    write_image(str(tmp_path / "site1" / "photo.png"))
+    write_image(str(tmp_path / "site2" / "photo.png"))
+    output = tmp_path / "output"
+
+    converter = Converter(str(output), workers=1)
+    assert converter.convert([str(tmp_path / "site1"), str(tmp_path / "site2")]) == 2
+    assert (output / "site1" / "photo.txt").read_text()
+    assert (output / "site2" / "photo.txt").read_text()
+
+
+@pytest.mark.parametrize("inputs", [
+    ["a/photos", "b/photos"],
+    ["a/photos/photo.png", "b/photos/photo.png"],
+    ["a/photos/photo.png", "a/photos/Photo.jpg"],
+])
+def test_colliding_outputs_are_rejected(tmp_path, inputs):
+    for path in ("a/photos/photo.png", "a/photos/Photo.jpg", "b/photos/photo.png"):
+        write_image(str(tmp_path / path))
+    output = tmp_path / "output"
+
+    with pytest.raises(ValueError):
+        Converter(str(output), workers=1).convert([str(tmp_path / path) for path in inputs])
+    assert not output.exists()
+
+
+def test_inputs_that_do_not_exist_are_rejected(tmp_path):
+    write_image(str(tmp_path / "photo.png"))
+    output = tmp_path / "output"
+
+    with pytest.raises(ValueError, match="clip.mp4"):
+        Converter(str(output), workers=1).convert([str(tmp_path / "photo.png"), str(tmp_path / "clip.mp4")])
+    assert not output.exists()
+
+
+def test_files_that_are_not_videos_are_rejected(tmp_path):
+    (tmp_path / "notes.md").write_text("# Notes\n")
+    output = tmp_path / "output"
+
+    with pytest.raises(ValueError, match="notes.md"):
+        Converter(str(output), workers=1).convert([str(tmp_path / "notes.md")])
+    assert not output.exists()
+
+
+def test_unreadable_images_are_reported(tmp_path):
+    write_image(str(tmp_path / "photos" / "photo.png"))
+    (tmp_path / "photos" / "broken.png").write_bytes(b"not an image")
+    output = tmp_path / "output"
+
+    converter = Converter(str(output), workers=1)
+    with pytest.raises(ValueError, match="broken.png"):
+        converter.convert([str(tmp_path / "photos")])
+
+    # The other images are still converted.
+    assert converter.converted == 1
+    assert (output / "photos" / "photo.txt").read_text()
+    assert not (output / "photos" / "broken.txt").exists()
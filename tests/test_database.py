@@ -0,0 +1,212 @@
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from camera import CameraUtils
+from database import Database, DatabaseUtils, PyxpicCache
+from fakes import MemoryOrderCounter
+from storage import SQLiteStorage, Storage
+
+
+@pytest.fixture
+def database(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "pyxmap.sqlite3"), str(tmp_path / "pyxpic"))
+    return Database(storage)
+
+
+def test_retried_add_keeps_the_pyxpic_id(database):
+    pyxpic_id = DatabaseUtils.create_random_pyxpic_id()
+    assert database.add_pyxpic(pyxpic_id, "owner", "@#\n") == pyxpic_id
+
+    # The retry of an attempt that actually succeeded does not add a copy.
+    assert database.add_pyxpic(pyxpic_id, "owner", "@#\n", exist_ok=True) == pyxpic_id
+    assert len(database.fetch_user_pyxpic("owner")) == 1
+
+
+def test_add_with_a_used_id_picks_a_new_one(database):
+    pyxpic_id = DatabaseUtils.create_random_pyxpic_id()
+    database.add_pyxpic(pyxpic_id, "owner", "@#\n")
+
+    assert database.add_pyxpic(pyxpic_id, "owner", "@#\n") != pyxpic_id
+    assert database.add_pyxpic(pyxpic_id, "other", "@#\n", exist_ok=True) != pyxpic_id
+    assert len(database.fetch_all_pyxpic()) == 3
+
+
+def test_concurrent_allocations_are_contiguous(tmp_path):
+    # Several connections to the same database, like several processes sharing it.
+    storages = [SQLiteStorage(str(tmp_path / "pyxmap.sqlite3"), str(tmp_path / "pyxpic")) for _ in range(4)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        firsts = list(executor.map(lambda i: storages[i % 4].order_counter.allocate(5), range(80)))
+
+    # Every range of 5 order numbers is reserved once, without gaps.
+    assert sorted(firsts) == list(range(0, 400, 5))
+    assert storages[0].order_counter.allocate() == 400
+
+
+def test_concurrent_adds_get_distinct_order_numbers(tmp_path):
+    databases = [Database(SQLiteStorage(str(tmp_path / "pyxmap.sqlite3"), str(tmp_path / "pyxpic"))) for _ in range(4)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        pyxpic_ids = list(executor.map(lambda i: databases[i % 4].add_pyxpic(None, "owner", "@#\n"), range(40)))
+
+    pyxpics = databases[0].fetch_all_pyxpic()
+    assert sorted(pyxpics) == sorted(pyxpic_ids)
+    assert sorted(pyxpic["order_number"] for pyxpic in pyxpics.values()) == list(range(40))
+
+
+def test_database_uses_the_given_order_counter(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "pyxmap.sqlite3"), str(tmp_path / "pyxpic"))
+    database = Database(storage, order_counter=MemoryOrderCounter(first=100))
+
+    pyxpic_ids = [database.add_pyxpic(None, "owner", "@#\n") for _ in range(3)]
+    assert [database.get_pyxpic(pyxpic_id)["order_number"] for pyxpic_id in pyxpic_ids] == [100, 101, 102]
+
+
+@pytest.mark.parametrize("pyxpic_id", ["../escape", "a/b", "", None, "not-a-uuid", "{12345678-1234-5678-1234-567812345678}"])
+def test_invalid_ids_are_rejected(database, pyxpic_id):
+    with pytest.raises(ValueError):
+        database.backend.create(pyxpic_id, {"owner_id": "owner", "raw_image": b"@"})
+
+
+def test_storage_backends_implement_the_interface():
+    class PartialStorage(Storage):
+        def get(self, pyxpic_id):
+            return None
+
+    with pytest.raises(TypeError):
+        PartialStorage()
+
+
+def test_frame_ramp_follows_the_camera_characters():
+    assert set(DatabaseUtils.FRAME_RAMP) == set(CameraUtils.ASCII_CHARS)
+    assert len(DatabaseUtils.FRAME_RAMP) <= 16
+
+
+def test_frame_round_trip():
+    ascii_frame = " .:-=\n+*#%@\n"
+    colors = np.random.default_rng(0).integers(0, 256, (2, 5, 3), dtype=np.uint8)
+    raw_image = DatabaseUtils.encode_raw_image(ascii_frame, colors)
+
+    assert raw_image[3] == DatabaseUtils.FRAME_VERSION
+    assert raw_image[5] == DatabaseUtils.FRAME_RAMP_ID
+    assert DatabaseUtils.decode_raw_image(raw_image) == ascii_frame
+    assert (DatabaseUtils.decode_raw_image_colors(raw_image).astype(int) - colors).max() < 64
+
+
+def test_frames_of_another_ramp_are_rejected():
+    raw_image = bytearray(DatabaseUtils.encode_raw_image("@\n"))
+    raw_image[5] ^= 0xff
+    with pytest.raises(ValueError):
+        DatabaseUtils.decode_raw_image(bytes(raw_image))
+
+
+def test_listen_needs_a_backend_that_can_watch(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "pyxmap.sqlite3"), str(tmp_path / "pyxpic"))
+    with pytest.raises(ValueError):
+        Database(storage, cache=PyxpicCache(), listen=True)
+    Database(storage, cache=PyxpicCache()).close()
+
+
+def test_cache_evicts_the_least_recently_used_entries():
+    cache = PyxpicCache(max_size=2, ttl=None)
+    cache.put("a", 1)
+    cache.put("b", 2)
+
+    # Reading "a" makes "b" the least recently used entry.
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_entries_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = PyxpicCache(ttl=10.0)
+    cache.put("a", 1)
+
+    now[0] += 9.9
+    assert cache.get("a") == 1
+    now[0] += 0.2
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_cache_stats_count_hits_and_misses():
+    cache = PyxpicCache()
+    cache.put("a", 1)
+    cache.get("a")
+    cache.get("a")
+    cache.get("b")
+
+    assert cache.stats() == {"hits": 2, "misses": 1, "evictions": 0, "hit_rate": 2 / 3, "size": 1}
+
+
+def test_cached_user_pyxpics_follow_the_changes(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "pyxmap.sqlite3"), str(tmp_path / "pyxpic"))
+    database = Database(storage, cache=PyxpicCache())
+    first = database.add_pyxpic(None, "alice", "@#\n")
+    second = database.add_pyxpic(None, "bob", "@#\n")
+    assert set(database.fetch_user_pyxpic("alice")) == {first}
+    assert set(database.fetch_user_pyxpic("bob")) == {second}
+
+    # The second read is served by the cache.
+    hits = database.cache.stats()["hits"]
+    assert set(database.fetch_user_pyxpic("alice")) == {first}
+    assert database.cache.stats()["hits"] > hits
+
+    # Moving a pyxpic to a new owner refreshes the pyxpics of both owners.
+    database.update_pyxpic(first, {"owner_id": "bob"})
+    assert database.fetch_user_pyxpic("alice") == {}
+    assert set(database.fetch_user_pyxpic("bob")) == {first, second}
+
+    third = database.add_pyxpic(None, "alice", "@#\n")
+    assert set(database.fetch_user_pyxpic("alice")) == {third}
+
+    database.delete_pyxpic(second)
+    assert set(database.fetch_user_pyxpic("bob")) == {first}
+
+
+class CountingOrderCounter(MemoryOrderCounter):
+    def __init__(self, first=0):
+        super().__init__(first)
+        self.allocations = 0
+
+    def allocate(self, count=1):
+        self.allocations += 1
+        return super().allocate(count)
+
+
+def test_export_then_import_keeps_the_pyxpics(tmp_path, database):
+    pyxpic_ids = [database.add_pyxpic(None, owner, "@#\n") for owner in ("alice", "bob", "alice")]
+    exported = {pyxpic_id: database.get_pyxpic(pyxpic_id) for pyxpic_id in pyxpic_ids}
+    archive = tmp_path / "export.zip"
+    assert database.export_pyxpics(str(archive)) == 3
+    with zipfile.ZipFile(archive) as f:
+        f.extractall(tmp_path / "export")
+    (tmp_path / "export" / "frame.txt").write_text("#@\n")
+
+    storage = SQLiteStorage(str(tmp_path / "other.sqlite3"), str(tmp_path / "other"))
+    counter = CountingOrderCounter(first=50)
+    imported_database = Database(storage, order_counter=counter)
+    assert imported_database.import_pyxpics(str(tmp_path / "export"), owner_id="carol", batch_size=2) == 4
+
+    # The order numbers are reserved at once, in the exported order.
+    assert counter.allocations == 1
+    for (offset, pyxpic_id) in enumerate(pyxpic_ids):
+        pyxpic = imported_database.get_pyxpic(pyxpic_id)
+        assert pyxpic["owner_id"] == exported[pyxpic_id]["owner_id"]
+        assert pyxpic["date"] == exported[pyxpic_id]["date"]
+        assert pyxpic["raw_image"] == exported[pyxpic_id]["raw_image"]
+        assert pyxpic["order_number"] == 50 + offset
+    (frame,) = imported_database.fetch_user_pyxpic("carol").values()
+    assert frame["order_number"] == 53
+
+
+def test_import_of_saved_frames_needs_an_owner(tmp_path, database):
+    (tmp_path / "frame.txt").write_text("#@\n")
+    with pytest.raises(ValueError):
+        database.import_pyxpics(str(tmp_path))
@@ -0,0 +1,31 @@
+import threading
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pyzbar")
+
+import qrcode
+from qrcode import QRCode, QRCodeUtils
+
+
+class FrameSession(object):
+    # A capture session returning the same frame forever.
+    def read(self):
+        return (True, np.zeros((8, 8, 3), dtype=np.uint8))
+
+
+def test_preview_runs_on_the_scan_thread(monkeypatch):
+    gui_threads = set()
+    monkeypatch.setattr(qrcode.cv2, "imshow", lambda title, frame: gui_threads.add(threading.get_ident()))
+    monkeypatch.setattr(qrcode.cv2, "waitKey", lambda delay: gui_threads.add(threading.get_ident()) or -1)
+    monkeypatch.setattr(qrcode.cv2, "destroyWindow", lambda title: gui_threads.add(threading.get_ident()))
+
+    # The QR Code is found by the background decoding after a few frames.
+    decoded = []
+    monkeypatch.setattr(QRCodeUtils, "decode", staticmethod(
+        lambda frame: decoded.append(threading.get_ident()) or ([("owner", (0, 0, 4, 4))] if len(decoded) > 3 else [])))
+
+    assert QRCode().read(session=FrameSession(), showCameraWindow=True, timeout=5) == "owner"
+    assert gui_threads == {threading.get_ident()}
+    assert threading.get_ident() not in decoded
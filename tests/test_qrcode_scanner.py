@@ -0,0 +1,101 @@
+import sys
+import types
+
+import numpy as np
+import pytest
+
+# The scanner logic does not need pyzbar: the decoding is stubbed below.
+# Import qrcode against an empty pyzbar module if it is not installed, without leaving it in sys.modules.
+try:
+    import pyzbar  # noqa: F401
+    import qrcode
+except ImportError:
+    stub = types.ModuleType("pyzbar")
+    stub.pyzbar = types.ModuleType("pyzbar.pyzbar")
+    sys.modules.update({"pyzbar": stub, "pyzbar.pyzbar": stub.pyzbar})
+    try:
+        import qrcode
+    finally:
+        del sys.modules["pyzbar"], sys.modules["pyzbar.pyzbar"]
+
+from qrcode import QRCodeScanner, QRCodeUtils
+
+
+FRAME = np.zeros((8, 8, 3), dtype=np.uint8)
+
+
+class FakeDecoder(object):
+    # Stands for QRCodeUtils.decode and decode_regions, returning the QR Codes "in view".
+    def __init__(self):
+        self.visible = []
+        self.full_calls = 0
+        self.region_calls = []
+
+    def decode(self, frame):
+        self.full_calls += 1
+        return list(self.visible)
+
+    def decode_regions(self, gray, regions, padding):
+        self.region_calls.append(regions)
+        return list(self.visible)
+
+
+@pytest.fixture
+def decoder(monkeypatch):
+    decoder = FakeDecoder()
+    monkeypatch.setattr(QRCodeUtils, "decode", staticmethod(decoder.decode))
+    monkeypatch.setattr(QRCodeUtils, "decode_regions", staticmethod(decoder.decode_regions))
+    return decoder
+
+
+def read(events):
+    return [event.data for event in events]
+
+
+def test_repeated_reads_are_reported_once_per_window(decoder):
+    scanner = QRCodeScanner(window=5.0)
+    decoder.visible = [("a", (0, 0, 4, 4))]
+    assert read(scanner.scan_frame(FRAME, timestamp=0.0)) == ["a"]
+    assert read(scanner.scan_frame(FRAME, timestamp=1.0)) == []
+
+    # A new QR Code is reported, not the one still in view.
+    decoder.visible = [("a", (0, 0, 4, 4)), ("b", (4, 4, 4, 4))]
+    assert read(scanner.scan_frame(FRAME, timestamp=2.0)) == ["b"]
+
+    # Read again after the window, it is reported again.
+    decoder.visible = [("a", (0, 0, 4, 4))]
+    assert read(scanner.scan_frame(FRAME, timestamp=8.0)) == ["a"]
+
+
+def test_tracked_codes_only_decode_their_regions(decoder):
+    scanner = QRCodeScanner(full_scan_interval=10)
+    decoder.visible = [("a", (0, 0, 4, 4))]
+    scanner.scan_frame(FRAME, timestamp=0.0)
+    assert (decoder.full_calls, decoder.region_calls) == (1, [])
+
+    # The next frames only decode around the tracked QR Code.
+    for i in range(1, 9):
+        scanner.scan_frame(FRAME, timestamp=i * 0.01)
+    assert decoder.full_calls == 1
+    assert decoder.region_calls == [[(0, 0, 4, 4)]] * 8
+
+    # The whole frame is decoded every full_scan_interval frames, to find the new QR Codes.
+    scanner.scan_frame(FRAME, timestamp=0.1)
+    assert decoder.full_calls == 2
+    assert (scanner.full_scans, scanner.roi_scans) == (2, 8)
+
+
+def test_tracks_expire(decoder):
+    scanner = QRCodeScanner(track_ttl=1.0)
+    decoder.visible = [("a", (0, 0, 4, 4))]
+    scanner.scan_frame(FRAME, timestamp=0.0)
+
+    # Out of view, the QR Code is still looked for in its region for a while.
+    decoder.visible = []
+    scanner.scan_frame(FRAME, timestamp=0.5)
+    assert len(decoder.region_calls) == 1
+    assert "a" in scanner.tracks
+
+    scanner.scan_frame(FRAME, timestamp=2.0)
+    assert len(decoder.region_calls) == 1
+    assert scanner.tracks == {}
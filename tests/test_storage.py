@@ -0,0 +1,129 @@
+import json
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+from database import Database, DatabaseUtils
+from storage import QueuedStorage, SQLiteOrderCounter, SQLiteStorage
+
+
+class OfflineStorage(SQLiteStorage):
+    # A remote storage that cannot be reached.
+    def get(self, pyxpic_id):
+        raise ConnectionError("offline")
+
+    def create_many(self, pyxpics):
+        raise ConnectionError("offline")
+
+
+class SlowStorage(SQLiteStorage):
+    # A remote storage whose batched creates wait until they are allowed to finish.
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.writing = threading.Event()
+        self.unblock = threading.Event()
+
+    def create_many(self, pyxpics):
+        self.writing.set()
+        self.unblock.wait(5)
+        return super().create_many(pyxpics)
+
+
+def get_storage(tmp_path, remote_class=SQLiteStorage):
+    remote = remote_class(str(tmp_path / "remote.sqlite3"), str(tmp_path / "pyxpic"))
+    return QueuedStorage(remote, str(tmp_path / "outbox.sqlite3"))
+
+
+def test_outbox_is_json(tmp_path):
+    storage = get_storage(tmp_path)
+    pyxpic_id = DatabaseUtils.create_random_pyxpic_id()
+    date = datetime(2023, 5, 4, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    storage.create(pyxpic_id, {"owner_id": "owner", "raw_image": b"\x00PXF\xff", "date": date, "order_number": None})
+
+    # The log holds plain JSON, with the date in ISO 8601 and the bytes in base64.
+    (text,) = storage.connection.execute("SELECT data FROM outbox").fetchone()
+    assert json.loads(text) == {"date": {"$date": "2023-05-04T12:30:15.123456+00:00"}, "order_number": None,
+                                "owner_id": "owner", "raw_image": {"$bytes": "AFBYRv8="}}
+    assert storage.get(pyxpic_id) == {"owner_id": "owner", "raw_image": b"\x00PXF\xff", "date": date, "order_number": None}
+
+
+def test_capture_works_offline(tmp_path):
+    storage = get_storage(tmp_path, OfflineStorage)
+    database = Database(storage)
+
+    pyxpic_id = database.add_pyxpic(None, "owner", "@#\n")
+    assert storage.depth() == 1
+    with pytest.raises(ConnectionError):
+        storage.flush()
+    assert storage.get(pyxpic_id)["owner_id"] == "owner"
+
+
+def test_delete_during_flush_reaches_the_remote(tmp_path):
+    storage = get_storage(tmp_path, SlowStorage)
+    storage.remote.order_counter = SQLiteOrderCounter(storage.remote)
+    pyxpic_id = DatabaseUtils.create_random_pyxpic_id()
+    storage.create(pyxpic_id, {"owner_id": "owner", "raw_image": b"@", "date": datetime.now()})
+
+    flush = threading.Thread(target=storage.flush)
+    flush.start()
+    assert storage.remote.writing.wait(5)
+
+    # Deleted while its batch is being written.
+    storage.delete(pyxpic_id)
+    storage.remote.unblock.set()
+    flush.join()
+
+    assert storage.get(pyxpic_id) is None
+    assert storage.depth() == 0
+
+
+def get_synced_storage(tmp_path):
+    storage = get_storage(tmp_path)
+    storage.remote.order_counter = SQLiteOrderCounter(storage.remote)
+    return storage
+
+
+def test_replayed_batch_is_not_a_conflict(tmp_path):
+    storage = get_synced_storage(tmp_path)
+    pyxpic_id = DatabaseUtils.create_random_pyxpic_id()
+    data = {"owner_id": "owner", "raw_image": b"@", "date": datetime.now(), "order_number": 7}
+
+    # The batch was written, but the sync stopped before removing it from the log.
+    storage.remote.create(pyxpic_id, dict(data))
+    storage.create(pyxpic_id, data)
+
+    assert storage.flush() == 1
+    assert storage.conflicts == 0 and storage.depth() == 0
+
+
+def test_used_id_is_reported_instead_of_overwritten(tmp_path):
+    storage = get_synced_storage(tmp_path)
+    pyxpic_id = DatabaseUtils.create_random_pyxpic_id()
+    storage.remote.create(pyxpic_id, {"owner_id": "someone", "raw_image": b"#", "date": datetime.now(), "order_number": 1})
+    storage.create(pyxpic_id, {"owner_id": "owner", "raw_image": b"@", "date": datetime.now(), "order_number": 2})
+
+    assert storage.flush() == 0
+    assert storage.conflicts == 1 and storage.depth() == 0
+    assert storage.remote.get(pyxpic_id)["owner_id"] == "someone"
+    conflict = storage.get_conflicts()[pyxpic_id]
+    assert conflict["data"]["owner_id"] == "owner" and conflict["remote_data"]["owner_id"] == "someone"
+
+
+def test_update_during_flush_replaces_the_written_pyxpic(tmp_path):
+    storage = get_storage(tmp_path, SlowStorage)
+    storage.remote.order_counter = SQLiteOrderCounter(storage.remote)
+    pyxpic_id = DatabaseUtils.create_random_pyxpic_id()
+    storage.create(pyxpic_id, {"owner_id": "owner", "raw_image": b"@", "date": datetime.now()})
+
+    flush = threading.Thread(target=storage.flush)
+    flush.start()
+    assert storage.remote.writing.wait(5)
+
+    # Updated while its batch is being written, the next batch replaces the written pyxpic.
+    storage.update(pyxpic_id, {"raw_image": b"#"})
+    storage.remote.unblock.set()
+    flush.join()
+
+    assert storage.remote.get(pyxpic_id)["raw_image"] == b"#"
+    assert storage.conflicts == 0 and storage.depth() == 0